@@ -0,0 +1,142 @@
+import heapq
+import itertools
+from fin_equiv import FinEquiv
+
+# Every partition except the empty one is a join of atoms (partitions with
+# a single non-trivial class of size two), so generators generate the whole
+# lattice Eq(n) if and only if their sublattice contains all the atoms
+# and their meet is the empty partition.
+#
+# For a pair a < b, let least[a,b] be the least element of the generated
+# sublattice relating a and b. It is the fixpoint of
+#   least[a,b] <= meet of the generators relating a and b
+#   least[a,c] <= least[a,b] | least[b,c]
+# (every element relating a and c is either a generator, a meet of two
+# elements relating a and c, or a join, in which case a and c are
+# connected by a path of pairs related by the joined elements)
+# The atom (a ~ b) is generated if and only if least[a,b] is that atom.
+
+def _pair(a,b):
+    return (a,b) if a < b else (b,a)
+
+def least_relating(generators, stop_when_complete = True):
+    # returns the dictionary least[a,b] for the pairs related by something
+    generators = list(generators)
+    if not generators: return dict()
+    num_nodes = generators[0].num_nodes
+    num_pairs = num_nodes * (num_nodes-1) // 2
+    least = dict()
+    for g in generators:
+        for c in g.nontriv_classes:
+            for pair in itertools.combinations(c, 2):
+                cur = least.get(pair)
+                least[pair] = g if cur is None else cur & g
+
+    # the finest elements are propagated first,
+    # pairs that already reached their atoms cannot improve
+    atoms = set()
+    heap = []
+    tiebreak = itertools.count()
+    def update(pair, candidate):
+        cur = least.get(pair)
+        if cur is not None:
+            candidate = cur & candidate
+            if candidate == cur: return
+        least[pair] = candidate
+        num_classes = candidate.num_classes
+        if num_classes == num_nodes-1: atoms.add(pair)
+        heapq.heappush(heap, (-num_classes, next(tiebreak), pair, candidate))
+
+    for pair, x in least.items():
+        if x.num_classes == num_nodes-1: atoms.add(pair)
+        heapq.heappush(heap, (-x.num_classes, next(tiebreak), pair, x))
+    while heap:
+        if stop_when_complete and len(atoms) == num_pairs: break
+        _, _, (a,b), x = heapq.heappop(heap)
+        if least[a,b] is not x: continue # outdated
+        for c in range(num_nodes):
+            if c == a or c == b: continue
+            ac = _pair(a,c)
+            bc = _pair(b,c)
+            if ac not in atoms and bc in least: update(ac, x | least[bc])
+            if bc not in atoms and ac in least: update(bc, x | least[ac])
+    return least
+
+def missing_atoms(generators):
+    # pairs (a,b) such that the atom (a ~ b) is not generated
+    generators = list(generators)
+    if not generators: return []
+    num_nodes = generators[0].num_nodes
+    least = least_relating(generators)
+    return [
+        pair for pair in itertools.combinations(range(num_nodes), 2)
+        if pair not in least or least[pair].num_classes < num_nodes-1
+    ]
+
+def generates_all(generators):
+    generators = list(generators)
+    if not generators: return False
+    bottom = generators[0]
+    for g in generators[1:]: bottom = bottom & g
+    if bottom != FinEquiv.empty(bottom.num_nodes): return False
+    return not missing_atoms(generators)
+
+def redundant_generators(generators):
+    # generators g such that the others still generate everything,
+    # the meets and joins of all the others are shared through prefixes and suffixes
+    generators = list(generators)
+    k = len(generators)
+    if k <= 1: return []
+    num_nodes = generators[0].num_nodes
+    empty = FinEquiv.empty(num_nodes)
+    full = FinEquiv.full(num_nodes)
+    prefix = [(full, empty)]
+    for g in generators:
+        meet, join = prefix[-1]
+        prefix.append((meet & g, join | g))
+    suffix = [(full, empty)]
+    for g in reversed(generators):
+        meet, join = suffix[-1]
+        suffix.append((meet & g, join | g))
+    suffix.reverse()
+    res = []
+    for i,g in enumerate(generators):
+        meet = prefix[i][0] & suffix[i+1][0]
+        join = prefix[i][1] | suffix[i+1][1]
+        if meet != empty or join != full: continue
+        if generates_all(generators[:i] + generators[i+1:]): res.append(g)
+    return res
+
+def minimal_generating_subset(generators, report = None):
+    # greedily drops the generators which are not needed,
+    # no generator of the result can be dropped,
+    # report(fraction) is called after every tested generator (see gui_jobs)
+    generators = list(generators)
+    num_tested = 0
+    total = len(generators)
+    i = 0
+    while i < len(generators):
+        rest = generators[:i] + generators[i+1:]
+        if generates_all(rest): generators = rest
+        else: i += 1
+        num_tested += 1
+        if report is not None: report(num_tested / total)
+    return generators
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_nodes', type=int, nargs='?', default=20)
+    parser.add_argument('num_generators', type=int, nargs='?', default=4)
+    args = parser.parse_args()
+
+    generators = [FinEquiv.random(args.num_nodes) for _ in range(args.num_generators)]
+    start = time.time()
+    missing = missing_atoms(generators)
+    print("missing atoms:", len(missing), missing[:10])
+    print("time:", time.time() - start)
+    if not missing:
+        print("redundant:", len(redundant_generators(generators)))
+        print("minimal subset:", len(minimal_generating_subset(generators)))
@@ -0,0 +1,173 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fin_equiv import FinEquiv, PartitionBatch, bell_number
+
+# Complete meet and join tables of Eq(n) for small n (Bell(7) = 877),
+# indexed by FinEquiv.get_index, as uint16 arrays stored in .npy files
+# in a cache directory (CACHE_DIR by default). Loaded tables are memory-mapped
+# read-only, so worker processes share the pages instead of keeping
+# their own copies. The tables are built by running this module.
+
+MAX_NODES = 8 # Bell(8) = 4140 still fits into uint16
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'equiv_game',
+)
+
+def _table_rows(num_nodes, start, stop):
+    import numpy as np
+    everything = PartitionBatch.at_indices(num_nodes, range(bell_number(num_nodes)))
+    rows = PartitionBatch._from_rgs(everything.labels[start:stop])
+    meet = rows.meet_table(everything).get_indices()
+    join = rows.join_table(everything).get_indices()
+    shape = (stop-start, len(everything))
+    return meet.astype(np.uint16).reshape(shape), join.astype(np.uint16).reshape(shape)
+
+def build_tables(num_nodes, num_workers = None, rows_per_task = 32):
+    # returns (meet, join), meet[i,j] is the index of at_index(i) & at_index(j)
+    import numpy as np
+    assert 0 <= num_nodes <= MAX_NODES
+    size = bell_number(num_nodes)
+    blocks = [
+        (start, min(size, start + rows_per_task))
+        for start in range(0, size, rows_per_task)
+    ]
+    if num_workers is None: num_workers = os.cpu_count() or 1
+    if num_workers == 1 or len(blocks) <= 1:
+        results = [_table_rows(num_nodes, a, b) for a,b in blocks]
+    else:
+        with ProcessPoolExecutor(num_workers) as executor:
+            futures = [
+                executor.submit(_table_rows, num_nodes, a, b)
+                for a,b in blocks
+            ]
+            results = [future.result() for future in futures]
+    meet = np.concatenate([m for m,_ in results])
+    join = np.concatenate([j for _,j in results])
+    return meet, join
+
+def _table_fnames(num_nodes, dir_path):
+    if dir_path is None: dir_path = CACHE_DIR
+    return (
+        os.path.join(dir_path, f"meet_{num_nodes}.npy"),
+        os.path.join(dir_path, f"join_{num_nodes}.npy"),
+    )
+def save_tables(num_nodes, dir_path = None, **kwargs):
+    import numpy as np
+    tables = build_tables(num_nodes, **kwargs)
+    if dir_path is None: dir_path = CACHE_DIR
+    os.makedirs(dir_path, exist_ok = True)
+    for fname, table in zip(_table_fnames(num_nodes, dir_path), tables):
+        np.save(fname, table)
+    return tables
+def load_tables(num_nodes, dir_path = None, build = False):
+    # memory-mapped tables, None if missing unless build is set,
+    # then they are built and saved first
+    import numpy as np
+    fnames = _table_fnames(num_nodes, dir_path)
+    if not all(os.path.isfile(fname) for fname in fnames):
+        if not build: return None
+        save_tables(num_nodes, dir_path)
+    return tuple(np.load(fname, mmap_mode = 'r') for fname in fnames)
+
+class TableLattice:
+    # Eq(n) given by its tables, elements are represented by their indices
+    def __init__(self, num_nodes, dir_path = None, build = False):
+        # the tables have to be saved already, unless build is set,
+        # building takes about a minute of CPU time for n = 8
+        self.num_nodes = num_nodes
+        tables = load_tables(num_nodes, dir_path, build)
+        if tables is None:
+            raise FileNotFoundError(
+                f"Missing tables for n = {num_nodes}, build them by: python cayley_tables.py {num_nodes}"
+            )
+        self.meet, self.join = tables
+        self.size = len(self.meet)
+        self.empty_index = FinEquiv.empty(num_nodes).get_index()
+        self.full_index = FinEquiv.full(num_nodes).get_index()
+
+    def __getitem__(self, equiv):
+        return TableEquiv(self, equiv.get_index())
+
+    def generate_lattice(self, indices):
+        # semi-naive closure as FinEquiv.generate_lattice,
+        # returns a boolean array over all the indices
+        import numpy as np
+        seen = np.zeros(self.size, dtype = bool)
+        new = np.unique(np.asarray(indices, dtype = np.intp))
+        seen[new] = True
+        old = new[:0]
+        while len(new) and not seen.all():
+            others = np.concatenate([old, new])
+            products = np.concatenate([
+                self.meet[new[:,None], others].ravel(),
+                self.join[new[:,None], others].ravel(),
+            ])
+            products = np.unique(products)
+            added = products[~seen[products]]
+            seen[added] = True
+            old = others
+            new = added.astype(np.intp)
+        return seen
+    def generates_all(self, indices):
+        return bool(self.generate_lattice(indices).all())
+
+class TableEquiv:
+    # drop-in replacement of FinEquiv for the lattice operations
+    __slots__ = ('lattice', 'index')
+
+    def __init__(self, lattice, index):
+        self.lattice = lattice
+        self.index = int(index)
+
+    @staticmethod
+    def from_equiv(lattice, equiv):
+        return TableEquiv(lattice, equiv.get_index())
+    def to_equiv(self):
+        return FinEquiv.at_index(self.lattice.num_nodes, self.index)
+
+    @property
+    def num_nodes(self):
+        return self.lattice.num_nodes
+    def get_index(self):
+        return self.index
+    def __str__(self):
+        return str(self.to_equiv())
+
+    def __eq__(self, other):
+        return isinstance(other, TableEquiv) and self.index == other.index and self.lattice is other.lattice
+    def __hash__(self):
+        return hash(self.index)
+
+    def __and__(self, other):
+        assert self.lattice is other.lattice
+        return TableEquiv(self.lattice, self.lattice.meet[self.index, other.index])
+    def __or__(self, other):
+        assert self.lattice is other.lattice
+        return TableEquiv(self.lattice, self.lattice.join[self.index, other.index])
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_nodes', type=int, nargs='?', default=7)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dir', default=None, help = f"where to save the tables, by default {CACHE_DIR}")
+    args = parser.parse_args()
+
+    start = time.time()
+    save_tables(args.num_nodes, args.dir, num_workers = args.workers)
+    print("built in", time.time() - start)
+
+    lattice = TableLattice(args.num_nodes, args.dir)
+    eqs = [FinEquiv.random(args.num_nodes) for _ in range(20)]
+    for eq1 in eqs:
+        for eq2 in eqs:
+            assert (lattice[eq1] & lattice[eq2]).to_equiv() == eq1 & eq2
+            assert (lattice[eq1] | lattice[eq2]).to_equiv() == eq1 | eq2
+    gens = eqs[:3]
+    closure = lattice.generate_lattice([eq.get_index() for eq in gens])
+    assert closure.sum() == len(FinEquiv.generate_lattice(gens))
+    print("closure:", closure.sum(), "of", lattice.size)
@@ -0,0 +1,101 @@
+import random
+
+from fin_equiv import FinEquiv, bell_number, stirling2
+
+# Choice of the partitions the player has to generate in the challenge mode.
+# Pure functions without the GUI.
+#
+# The partitions are sampled as indices (FinEquiv.at_index), so the time
+# and memory depend only on the number of samples and excluded partitions.
+
+def sample_indices(population, k, excluded = (), rng = None):
+    # k distinct indices from range(population) outside 'excluded',
+    # by Floyd's algorithm, fewer if there are not enough of them
+    if rng is None: rng = random
+    excluded = sorted(set(x for x in excluded if 0 <= x < population))
+    size = population - len(excluded)
+    k = min(k, size)
+    chosen = set()
+    res = []
+    for j in range(size-k, size):
+        t = rng.randrange(j+1)
+        if t in chosen: t = j
+        chosen.add(t)
+        res.append(t)
+    rng.shuffle(res)
+    # the t-th index not excluded
+    for i,t in enumerate(res):
+        for x in excluded:
+            if x > t: break
+            t += 1
+        res[i] = t
+    return res
+
+def sample_partitions(num_nodes, k, excluded = (), rng = None):
+    # uniform sample without replacement
+    indices = sample_indices(
+        bell_number(num_nodes), k,
+        (equiv.get_index() for equiv in excluded), rng,
+    )
+    return [FinEquiv.at_index(num_nodes, index) for index in indices]
+
+def sample_partitions_with_classes(num_nodes, num_classes, k, excluded = (), rng = None):
+    # uniform sample without replacement among the partitions with num_classes classes
+    indices = sample_indices(
+        stirling2(num_nodes, num_classes), k,
+        (
+            equiv.get_index_with_classes()
+            for equiv in excluded if equiv.num_classes == num_classes
+        ), rng,
+    )
+    return [
+        FinEquiv.at_index_with_classes(num_nodes, num_classes, index)
+        for index in indices
+    ]
+
+def sample_stratified(num_nodes, k, excluded = (), rng = None):
+    # spreads the samples evenly over the numbers of classes,
+    # the strata with fewer partitions are used first
+    if rng is None: rng = random
+    excluded = list(excluded)
+    strata = sorted(range(num_nodes+1), key = lambda c: stirling2(num_nodes, c))
+    strata = [c for c in strata if stirling2(num_nodes, c) > 0]
+    res = []
+    for i,c in enumerate(strata):
+        share = -(-(k - len(res)) // (len(strata) - i))
+        res.extend(sample_partitions_with_classes(num_nodes, c, share, excluded, rng))
+    rng.shuffle(res)
+    return res
+
+def generate_challenges(num_nodes, used, max_challenges, last_verified = None,
+                        seed = None, stratified = False):
+    # up to max_challenges partitions outside 'used',
+    # taken from last_verified if the previous challenges were solved
+    rng = random.Random(seed)
+    used = set(used)
+    if last_verified is not None:
+        remaining = [equiv for equiv in last_verified if equiv not in used]
+        return rng.sample(remaining, min(max_challenges, len(remaining)))
+    if stratified: return sample_stratified(num_nodes, max_challenges, used, rng)
+    return sample_partitions(num_nodes, max_challenges, used, rng)
+
+if __name__ == "__main__":
+    import time
+    from collections import Counter
+
+    assert sorted(sample_indices(10, 20, [3,5])) == [0,1,2,4,6,7,8,9]
+    counts = Counter(
+        x for _ in range(10000)
+        for x in sample_indices(6, 2, [1, 4])
+    )
+    print(sorted(counts.items()))
+
+    n = 5
+    used = FinEquiv.collect_all(n)[::2]
+    assert not set(sample_partitions(n, 100, used)) & set(used)
+    assert len(sample_partitions(n, 100, used)) == len(FinEquiv.collect_all(n)) - len(used)
+    print(sorted(eq.num_classes for eq in sample_stratified(n, 10, used)))
+
+    start = time.time()
+    challenges = generate_challenges(30, used = [FinEquiv.empty(30), FinEquiv.full(30)], max_challenges = 4)
+    print("n = 30:", time.time() - start)
@@ -0,0 +1,234 @@
+from array import array
+
+from fin_equiv import FinEquiv, bell_number
+from atom_check import generates_all
+
+# Closure of a set of generators which remembers how every element was found.
+# The elements are processed in the order of discovery, every one is combined
+# with all the earlier ones, so it is a breadth-first search and the depth
+# of an element is the smallest depth of a term producing it.
+# Every element stores a single parent pointer: the operation and the indices
+# of the two (earlier) operands, the terms are rebuilt on demand.
+#
+# The generators can be added and removed one by one. After such changes,
+# the depths are only upper bounds on the shortest terms.
+
+GENERATOR, MEET, JOIN = 0, 1, 2
+
+class Closure:
+    def __init__(self, num_nodes, generators = (), max_size = None, target = None,
+                 report = None):
+        # the search stops once it has max_size elements, or finds the target,
+        # such a closure is not complete and changes of generators recompute it,
+        # report(fraction) gets the number of elements relative to the limit
+        self.num_nodes = num_nodes
+        self.max_size = max_size
+        self.target = target
+        self.report = report
+        self.generators = []
+        for g in generators:
+            if g not in self.generators: self.generators.append(g)
+        self._build()
+
+    def _build(self):
+        self.elements = []
+        self.index = dict()
+        self.ops = array('b')
+        self.left = array('l')
+        self.right = array('l')
+        self.depths = array('l')
+        self.processed = 0 # the elements combined with all the earlier ones
+        for gi, g in enumerate(self.generators):
+            self._add(g, GENERATOR, gi, -1)
+        self._extend()
+
+    def _add(self, equiv, op, i, j):
+        if equiv in self.index: return False
+        if op == GENERATOR: depth = 0
+        else: depth = max(self.depths[i], self.depths[j]) + 1
+        self.index[equiv] = len(self.elements)
+        self.elements.append(equiv)
+        self.ops.append(op)
+        self.left.append(i)
+        self.right.append(j)
+        self.depths.append(depth)
+        return True
+
+    def _extend(self):
+        limit = bell_number(self.num_nodes)
+        if self.max_size is not None: limit = min(limit, self.max_size)
+        elements = self.elements
+        while self.processed < len(elements) and len(elements) < limit:
+            if self.target is not None and self.target in self.index: break
+            i = self.processed
+            x = elements[i]
+            for j in range(i):
+                y = elements[j]
+                self._add(x & y, MEET, i, j)
+                self._add(x | y, JOIN, i, j)
+                if len(elements) >= limit: break
+            else:
+                self.processed += 1
+                if self.report is not None: self.report(len(elements) / limit)
+                continue
+            break
+        if len(elements) == bell_number(self.num_nodes):
+            self.processed = len(elements)
+        self.complete = self.processed == len(elements)
+
+    def __len__(self):
+        return len(self.elements)
+    def __contains__(self, equiv):
+        return equiv in self.index
+    @property
+    def generates_all(self):
+        return len(self.elements) == bell_number(self.num_nodes)
+
+    # changes of the generators
+
+    def add_generator(self, g):
+        # only the new combinations are processed
+        if g in self.generators: return
+        self.generators.append(g)
+        if not self.complete: return self._build()
+        gi = len(self.generators)-1
+        i = self.index.get(g)
+        if i is None:
+            self._add(g, GENERATOR, gi, -1)
+            self._extend()
+        else: # the closure stays the same, the element gets a shorter derivation
+            self.ops[i] = GENERATOR
+            self.left[i] = gi
+            self.right[i] = -1
+            self.depths[i] = 0
+
+    def remove_generator(self, g):
+        # The elements not derived from g are kept, the other ones are added
+        # back if they are the meet of the kept elements above them,
+        # or the join of the kept elements below them.
+        # Once no such element is left, the kept elements form a sublattice.
+        gi = self.generators.index(g)
+        del self.generators[gi]
+        if not self.complete: return self._build()
+
+        old = self.elements, self.ops, self.left, self.right
+        affected = bytearray(len(self.elements))
+        for i, (op, l, r) in enumerate(zip(*old[1:])):
+            if op == GENERATOR: affected[i] = (l == gi)
+            else: affected[i] = affected[l] or affected[r]
+
+        self.elements = []
+        self.index = dict()
+        self.ops = array('b')
+        self.left = array('l')
+        self.right = array('l')
+        old_depths, self.depths = self.depths, array('l')
+        pending = []
+        for i, (equiv, op, l, r) in enumerate(zip(*old)):
+            if affected[i]:
+                pending.append(equiv)
+                continue
+            if op == GENERATOR:
+                self._add(equiv, op, l - (l > gi), -1)
+            else:
+                l = self.index[old[0][l]]
+                r = self.index[old[0][r]]
+                self._add(equiv, op, l, r)
+            # keep the depths, the derivation did not change
+            self.depths[-1] = old_depths[i]
+
+        changed = True
+        while changed:
+            changed = False
+            remaining = []
+            for equiv in pending:
+                if equiv in self.index: continue
+                if self._rederive(equiv): changed = True
+                else: remaining.append(equiv)
+            pending = remaining
+        self.processed = len(self.elements)
+
+    def _rederive(self, equiv):
+        # adds the chain of the partial meets (joins) leading to equiv,
+        # all of them are in the closure
+        above = [x for x in self.elements if equiv.refines(x)]
+        below = [x for x in self.elements if x.refines(equiv)]
+        for op, operands in ((MEET, above), (JOIN, below)):
+            if not operands: continue
+            acc = operands[0]
+            for x in operands[1:]:
+                if op == MEET: res = acc & x
+                else: res = acc | x
+                if res == acc: continue
+                self._add(res, op, self.index[acc], self.index[x])
+                acc = res
+            if acc == equiv: return True
+        return False
+
+    # derivations
+
+    def depth(self, equiv):
+        return self.depths[self.index[equiv]]
+
+    def derivation(self, equiv):
+        # (op, x, y) the last step, for a generator (GENERATOR, generator index, None)
+        i = self.index[equiv]
+        op = self.ops[i]
+        if op == GENERATOR: return op, self.left[i], None
+        return op, self.elements[self.left[i]], self.elements[self.right[i]]
+
+    def term(self, equiv, names = None):
+        # a term for equiv as a string over the names of the generators,
+        # None if equiv is not in the closure
+        if equiv not in self.index: return None
+        if names is None: names = [f"g{i+1}" for i in range(len(self.generators))]
+        symbols = {MEET : ' & ', JOIN : ' | '}
+        def build(i, outer):
+            op = self.ops[i]
+            if op == GENERATOR: return names[self.left[i]]
+            res = build(self.left[i], True) + symbols[op] + build(self.right[i], True)
+            if outer: res = '('+res+')'
+            return res
+        return build(self.index[equiv], False)
+
+def closure_size(num_nodes, generators, max_size = None, report = None):
+    # (size, complete) for running as a gui_jobs.Job,
+    # the atom check recognizes the generating sets without building the closure
+    if generates_all(generators): return bell_number(num_nodes), True
+    closure = Closure(num_nodes, generators, max_size = max_size, report = report)
+    return len(closure), closure.complete
+
+def find_term(num_nodes, generators, target, names = None, max_size = None, report = None):
+    # (term, complete) for running as a gui_jobs.Job, the term is None
+    # if target was not reached, complete tells whether it can't be
+    closure = Closure(num_nodes, generators, max_size = max_size, target = target, report = report)
+    return closure.term(target, names), closure.complete
+
+if __name__ == "__main__":
+    def check(closure):
+        assert set(closure.elements) == FinEquiv.generate_lattice(closure.generators)
+        env = {f"g{i+1}" : g for i,g in enumerate(closure.generators)}
+        for equiv in closure.elements:
+            assert eval(closure.term(equiv), env) == equiv
+
+    n = 6
+    gens = []
+    while len(gens) < 4:
+        g = FinEquiv.random(n)
+        if g not in gens: gens.append(g)
+    closure = Closure(n, gens[:3])
+    check(closure)
+    print(len(closure), "elements, max depth", max(closure.depths))
+    print(closure.elements[-1], '=', closure.term(closure.elements[-1]))
+    closure.add_generator(gens[3])
+    check(closure)
+    for g in gens[:3]:
+        closure.remove_generator(g)
+        check(closure)
+    closure.add_generator(gens[0])
+    check(closure)
+
+    target = (gens[0] & gens[1]) | gens[2]
+    term, complete = find_term(n, gens, target)
+    assert eval(term, {f"g{i+1}" : g for i,g in enumerate(gens)}) == target
+    assert closure_size(n, gens) == (len(FinEquiv.generate_lattice(gens)), True)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import random
+import argparse
+
+from fin_equiv import FinEquiv, bell_number
+import atom_check
+
+# Command line tool for checking generator sets without the GUI,
+# it imports neither gi nor NumPy. The input is either a state saved
+# by equiv_game.py (saved_{n}.json), or a JSON list of partitions,
+# every partition given as a list of classes. The results are printed as JSON.
+
+def load_generators(fname, num_nodes = None):
+    # returns (num_nodes, names, generators)
+    if fname == '-': data = json.load(sys.stdin)
+    else:
+        with open(fname) as f: data = json.load(f)
+    if isinstance(data, dict): # saved state
+        num_nodes = len(data['nodes'])
+        rows = [row for row in data['equiv_list']['rows'] if row['is_generator']]
+        names = [row['name'] for row in rows]
+        generators = [FinEquiv(num_nodes, row['equiv']) for row in rows]
+    else:
+        if num_nodes is None:
+            num_nodes = max((x+1 for classes in data for c in classes for x in c), default = 0)
+        names = [f"g{i+1}" for i in range(len(data))]
+        generators = [FinEquiv(num_nodes, classes) for classes in data]
+    return num_nodes, names, generators
+
+def check(num_nodes, names, generators, closure_limit):
+    res = {
+        "num_nodes" : num_nodes,
+        "num_generators" : len(generators),
+    }
+    start = time.perf_counter()
+    missing = atom_check.missing_atoms(generators)
+    bottom = FinEquiv.full(num_nodes)
+    for g in generators: bottom = bottom & g
+    res["generates_all"] = bool(generators) and not missing and bottom == FinEquiv.empty(num_nodes)
+    res["missing_atoms"] = missing
+    res["check_time"] = time.perf_counter() - start
+    if bell_number(num_nodes) <= closure_limit:
+        start = time.perf_counter()
+        res["closure_size"] = len(FinEquiv.generate_lattice(generators))
+        res["closure_time"] = time.perf_counter() - start
+    res["bell_number"] = bell_number(num_nodes)
+    return res
+
+def reduce_generators(num_nodes, names, generators):
+    res = {
+        "num_nodes" : num_nodes,
+        "generates_all" : atom_check.generates_all(generators),
+    }
+    if not res["generates_all"]: return res
+    name_of = dict(zip(generators, names))
+    redundant = atom_check.redundant_generators(generators)
+    minimal = atom_check.minimal_generating_subset(generators)
+    res["redundant"] = [name_of[g] for g in redundant]
+    res["minimal"] = [name_of[g] for g in minimal]
+    res["minimal_classes"] = [g.classes for g in minimal]
+    return res
+
+def bench(num_nodes, num_generators, repeat, seed):
+    rng = random.Random(seed)
+    equivs = [FinEquiv.random(num_nodes, rng) for _ in range(repeat)]
+    res = {"num_nodes" : num_nodes}
+    start = time.perf_counter()
+    for x,y in zip(equivs, equivs[1:]): x & y
+    res["meet_us"] = 1e6 * (time.perf_counter() - start) / max(1, repeat-1)
+    start = time.perf_counter()
+    for x,y in zip(equivs, equivs[1:]): x | y
+    res["join_us"] = 1e6 * (time.perf_counter() - start) / max(1, repeat-1)
+    start = time.perf_counter()
+    num_complete = 0
+    num_checks = max(1, repeat // 100)
+    for _ in range(num_checks):
+        generators = [FinEquiv.random(num_nodes, rng) for _ in range(num_generators)]
+        num_complete += atom_check.generates_all(generators)
+    res["check_ms"] = 1e3 * (time.perf_counter() - start) / num_checks
+    res["fraction_generating"] = num_complete / num_checks
+    return res
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Checks of partition generators")
+    output_parser = argparse.ArgumentParser(add_help = False)
+    output_parser.add_argument('-o', '--output', default=None, help = "output file instead of stdout")
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+    for command in ('check', 'reduce'):
+        subparser = subparsers.add_parser(command, parents = [output_parser])
+        subparser.add_argument('file', help = "saved state or JSON list of partitions, '-' for stdin")
+        subparser.add_argument('-n', '--num-nodes', type=int, default=None,
+                               help = "for a list of partitions, by default the largest node + 1")
+    subparsers.choices['check'].add_argument(
+        '--closure-limit', type=int, default=1000,
+        help = "compute the whole closure if Bell(n) does not exceed this",
+    )
+    bench_parser = subparsers.add_parser('bench', parents = [output_parser])
+    bench_parser.add_argument('num_nodes', type=int)
+    bench_parser.add_argument('--num-generators', type=int, default=4)
+    bench_parser.add_argument('--repeat', type=int, default=10000)
+    bench_parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        res = bench(args.num_nodes, args.num_generators, args.repeat, args.seed)
+    else:
+        num_nodes, names, generators = load_generators(args.file, args.num_nodes)
+        if args.command == 'check':
+            res = check(num_nodes, names, generators, args.closure_limit)
+        else:
+            res = reduce_generators(num_nodes, names, generators)
+
+    if args.output is None:
+        json.dump(res, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f: json.dump(res, f, indent = 2)
+    if args.command == 'check' and not res["generates_all"]: return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
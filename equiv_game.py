@@ -1,32 +1,53 @@
 #!/usr/bin/python3
 
+import time
+# timeline of the startup, reported by --profile-startup
+_startup_marks = [("script start", time.perf_counter())]
+FIRST_FRAME_TARGET = 0.3 # seconds from the process start to the first frame
+def _mark(name):
+    _startup_marks.append((name, time.perf_counter()))
+
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk, GLib
-import numpy as np
+import cairo
+_mark("import gi")
+import math
 import os
-import random
 import argparse
 import json
 
 from gui_tool import EditTool, GenerateTool
 from fin_equiv import FinEquiv, bell_number
 from gui_eq_list import EquivList
+from atom_check import minimal_generating_subset
+from challenges import generate_challenges
+from node_grid import NodeGrid
+# gui_jobs (multiprocessing) and closure (see gui_eq_list) are imported when needed
+_mark("import modules")
 
 class EquivalencesGUI(Gtk.Window):
-    def __init__(self, num_nodes, load_on_start, save_on_quit, win_size = (1100,800)):
+    def __init__(self, num_nodes, load_on_start, save_on_quit, win_size = (1100,800),
+                 profile_startup = False):
         super().__init__()
 
         self.nodes = [
-            (np.sin(x), np.cos(x))
-            for x in np.linspace(0, 2*np.pi, num_nodes+1)[:-1]
+            (math.sin(2*math.pi*i / num_nodes), math.cos(2*math.pi*i / num_nodes))
+            for i in range(num_nodes)
         ]
         self.num_nodes = num_nodes
-        self.equivalence = FinEquiv.random(num_nodes)
+        self.nodes_version = 0
+        self.layers = dict()
+        self.nodes_moved()
+        self.equivalence = FinEquiv.random(num_nodes) # unless a state is loaded
+        self.first_frame = True
+        self.profile_startup = profile_startup
 
         self.node_radius = 10
         self.node_neighborhood = 2*self.node_radius
         self.max_challenges = 4
+        self.hint_max_size = 3000 # elements of the closure searched for a hint
+        self.closure_max_size = 5000 # elements counted by update_closure_label
         self.last_verified = None
 
         self.basic_tool = EditTool(self)
@@ -34,7 +55,10 @@ class EquivalencesGUI(Gtk.Window):
         self.darea = Gtk.DrawingArea()
         self.equiv_list = EquivList(self)
         self.cur_challenge = None
-        self.min_gen = bell_number(self.num_nodes)+1
+        self.verify_job = None
+        self.verify_job_kept = False
+        self.closure_job = None
+        self.min_gen = math.inf
         self._num_solved = 0
 
         vbox = Gtk.VBox()
@@ -53,7 +77,7 @@ class EquivalencesGUI(Gtk.Window):
         self.generate_button.connect("toggled", self.generate_mode_clicked)
         toolbar.pack_start(self.generate_button, False, False, 0)
         self.challenge_button = Gtk.RadioButton.new_with_label_from_widget(self.edit_button, "Challenge")
-        self.challenge_button.set_tooltip_text("Show that your generators work (F6)")
+        self.challenge_button.set_tooltip_text("Show that your generators work (F6), hint (H)")
         self.challenge_button.set_mode(False)
         self.challenge_button.connect("toggled", self.challenge_mode_clicked)
         subvbox = Gtk.VBox()
@@ -65,6 +89,13 @@ class EquivalencesGUI(Gtk.Window):
 
         self.label_best_sol = Gtk.Label(label = "no solution yet...")
         toolbar.pack_start(self.label_best_sol, False, False, 20)
+        self.label_closure = Gtk.Label()
+        if self.equiv_list.closure is None:
+            self.label_closure.set_tooltip_text(
+                f"Counted in the background, up to {self.closure_max_size} equivalences"
+            )
+        toolbar.pack_start(self.label_closure, False, False, 20)
+        self.update_closure_label()
 
         undo_button = Gtk.Button.new_from_icon_name("edit-undo", Gtk.IconSize.LARGE_TOOLBAR)
         empty_button = Gtk.Button.new_from_icon_name("input-dialpad-symbolic", Gtk.IconSize.LARGE_TOOLBAR)
@@ -112,9 +143,11 @@ class EquivalencesGUI(Gtk.Window):
 
         self.scale = 100
         self.shift = (0,0)
+        _mark("create widgets")
         self.show_all()
         if load_on_start: self.load_state()
         self.save_on_quit = save_on_quit
+        _mark("load state")
 
     @property
     def num_solved(self):
@@ -125,6 +158,41 @@ class EquivalencesGUI(Gtk.Window):
         if x == 0: self.solved_progress_bar.set_fraction(0)
         else: self.solved_progress_bar.set_fraction(x / len(self.challenges))
 
+    def update_closure_label(self):
+        # the live closure of the list if there is one, otherwise the closure
+        # is counted by a worker, which is not started before the first frame
+        # (the first job starts the fork server)
+        self.cancel_closure_job()
+        closure = self.equiv_list.closure
+        if closure is not None:
+            self.closure_counted((len(closure), closure.complete))
+            return
+        generators = list(self.equiv_list.get_generators())
+        if not generators: self.closure_counted((0, True))
+        elif self.first_frame: self.label_closure.set_text("") # see after_first_frame
+        else:
+            from gui_jobs import Job
+            from closure import closure_size
+            self.label_closure.set_text("counting...")
+            self.closure_job = Job(
+                closure_size, self.num_nodes, generators,
+                max_size = self.closure_max_size,
+                on_done = self.closure_counted,
+                on_progress = lambda fraction: self.label_closure.set_text(f"counting... {fraction:.0%}"),
+            )
+    def closure_counted(self, result):
+        self.closure_job = None
+        size, complete = result
+        total = bell_number(self.num_nodes)
+        if size == total: text = "generates everything"
+        elif complete: text = f"generated {size} of {total}"
+        else: text = f"generated over {size} of {total}"
+        self.label_closure.set_text(text)
+    def cancel_closure_job(self):
+        if self.closure_job is None: return
+        self.closure_job.cancel()
+        self.closure_job = None
+
     def update_win_size(self):
         self.win_size = (self.darea.get_allocated_width(), self.darea.get_allocated_height())
 
@@ -161,14 +229,13 @@ class EquivalencesGUI(Gtk.Window):
         self.darea.queue_draw()
 
     def find_node(self, pixel, tolerance = 1):
-        px,py = pixel
-        pixel_nodes = [self.coor_to_pixel(node) for node in self.nodes]
-        sq_dist, node = min(
-            ((x-px)**2 + (y-py)**2, i)
-            for i,(x,y) in enumerate(pixel_nodes)
-        )
-        if (sq_dist / tolerance**2) < self.node_neighborhood**2: return node
-        else: return None
+        # the grid is in the node coordinates, so that it survives panning,
+        # after zooming, it is rebuilt only if its cells don't fit the radius
+        radius = self.node_neighborhood * tolerance / self.scale
+        grid = self.node_grid
+        if grid is None or not radius / 2 <= grid.cell_size <= 2*radius:
+            grid = self.node_grid = NodeGrid(self.nodes, radius)
+        return grid.nearest(self.pixel_to_coor(pixel), radius)
 
     def set_equiv(self, equiv):
         self.save_undo()
@@ -194,8 +261,11 @@ class EquivalencesGUI(Gtk.Window):
         if keyval_name == 'F4': self.edit_button.set_active(True)
         if keyval_name == 'F5': self.generate_button.set_active(True)
         if keyval_name == 'F6': self.challenge_button.set_active(True)
+        if keyval_name == 'h': self.show_hint()
 
     def quit_app(self, *args):
+        self.cancel_verify_job()
+        self.cancel_closure_job()
         if self.save_on_quit: self.save_state()
         Gtk.main_quit()
 
@@ -236,9 +306,8 @@ class EquivalencesGUI(Gtk.Window):
             return False
         self.basic_tool = basic_tool
         self.tool = basic_tool
-        self.challenges = self.generate_challenges()
-        if self.challenges: self.was_solved = False
-        else: self.was_solved = True
+        self.challenges = self.choose_challenges()
+        self.was_solved = not self.challenges
         self.cur_challenge = None
         self.num_solved = 0
         self.equiv_list.edit_mode = False
@@ -258,21 +327,18 @@ class EquivalencesGUI(Gtk.Window):
                 dialog.run()
                 dialog.destroy()
             else:
-                dialog = Gtk.MessageDialog(
-                    transient_for=self,
-                    flags=0,
-                    message_type=Gtk.MessageType.INFO,
-                    buttons=Gtk.ButtonsType.OK,
-                    text="Congratulations!"
-                )
                 generators = list(self.equiv_list.get_generators())
-                num_gen = len(generators)
-                dialog.format_secondary_text(f"You solved the challenges using {num_gen} generators.\nCould there be a better solution?\nNext time, the current generators will be used for challenges.")
-                dialog.run()
-                dialog.destroy()
+                names = {row.equiv : row.name for row in self.equiv_list.get_rows()}
                 self.last_verified = generators
-                self.min_gen = min(num_gen, self.min_gen)
+                self.min_gen = min(len(generators), self.min_gen)
                 self.label_best_sol.set_text(f"Record: {self.min_gen} generators")
+                # the dialog waits for the subset of the generators which suffices,
+                # also after switching to the edit mode
+                self.start_verify_job(
+                    minimal_generating_subset, generators,
+                    on_done = lambda minimal: self.show_solved(generators, minimal, names),
+                    keep_in_edit_mode = True,
+                )
 
             self.was_solved = True
             return False
@@ -288,8 +354,62 @@ class EquivalencesGUI(Gtk.Window):
             self.cur_challenge = None
             self.start_challenge()
 
+    def show_solved(self, generators, minimal, names):
+        dialog = Gtk.MessageDialog(
+            transient_for=self,
+            flags=0,
+            message_type=Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK,
+            text="Congratulations!"
+        )
+        num_gen = len(generators)
+        text = f"You solved the challenges using {num_gen} generators.\nCould there be a better solution?\nNext time, the current generators will be used for challenges."
+        # if the generators don't generate everything, none of them is dropped
+        if len(minimal) < num_gen:
+            names = [names[g] for g in minimal]
+            text += f"\nIn fact, {len(minimal)} of them suffice: {', '.join(names)}."
+        dialog.format_secondary_text(text)
+        dialog.run()
+        dialog.destroy()
+
+    def show_hint(self, *args):
+        # a term from the live closure of the list if there is one,
+        # otherwise the target is searched for by a worker, up to hint_max_size elements
+        challenge = self.cur_challenge
+        if challenge is None: return
+        closure = self.equiv_list.closure
+        names = {row.equiv : row.name for row in self.equiv_list.get_rows()}
+        if closure is not None:
+            names = [names[g] for g in closure.generators]
+            self.hint_found(challenge, (closure.term(challenge, names), closure.complete))
+            return
+        from closure import find_term
+        generators = list(self.equiv_list.get_generators())
+        self.start_verify_job(
+            find_term, self.num_nodes, generators, challenge, [names[g] for g in generators],
+            max_size = self.hint_max_size,
+            on_done = lambda result: self.hint_found(challenge, result),
+        )
+    def hint_found(self, challenge, result):
+        if challenge != self.cur_challenge: return # solved in the meantime
+        term, complete = result
+        if term is None:
+            if complete: term = "The challenge cannot be generated."
+            else: term = f"No hint within {self.hint_max_size} generated equivalences."
+        dialog = Gtk.MessageDialog(
+            transient_for=self,
+            flags=0,
+            message_type=Gtk.MessageType.INFO,
+            buttons=Gtk.ButtonsType.OK,
+            text="Hint"
+        )
+        dialog.format_secondary_text(term)
+        dialog.run()
+        dialog.destroy()
+
     def end_generate_mode(self):
         self.cur_challenge = None
+        if not self.verify_job_kept: self.cancel_verify_job()
         if self.equiv_list.edit_mode: return
         del self.challenges
         self.num_solved = 0
@@ -311,16 +431,24 @@ class EquivalencesGUI(Gtk.Window):
     def draw_node(self, cr, node_i):
         x,y = self.coor_to_pixel(self.nodes[node_i])
         cr.set_source_rgb(0,0,0)
-        cr.arc(x, y, self.node_radius, 0, 2*np.pi)
+        cr.arc(x, y, self.node_radius, 0, 2*math.pi)
         cr.fill()
     def draw_isolated(self, cr, p):
         x,y = self.coor_to_pixel(self.nodes[p])
         cr.set_source_rgba(0.5,0.5,0.5,0.5)
-        cr.arc(x, y, self.node_neighborhood, 0, 2*np.pi)
+        cr.arc(x, y, self.node_neighborhood, 0, 2*math.pi)
         cr.fill()
-    def draw_comp(self, cr, c, i):
-        hue = (i / len(self.display_equiv.nontriv_classes) + 0.5) % 1
-        color = self.hsv.to_rgb(hue, 1, 1)
+    def nodes_moved(self):
+        # to be called after every change of self.nodes
+        self.nodes_version += 1
+        self.stroke_orders = dict()
+        self.node_grid = None
+
+    def stroke_order(self, c):
+        # order of the nodes of a class for drawing, cached until the nodes move
+        c = tuple(c)
+        order = self.stroke_orders.get(c)
+        if order is not None: return order
         nodes = [
             self.nodes[p]
             for p in c
@@ -352,9 +480,17 @@ class EquivalencesGUI(Gtk.Window):
                 end.append(j)
                 remains.remove(j)
 
+        order = [c[i] for i in list(reversed(start)) + end]
+        if len(self.stroke_orders) >= 4096: self.stroke_orders.clear()
+        self.stroke_orders[c] = order
+        return order
+
+    def draw_comp(self, cr, c, i):
+        hue = (i / len(self.display_equiv.nontriv_classes) + 0.5) % 1
+        color = self.hsv.to_rgb(hue, 1, 1)
         nodes = [
-            self.coor_to_pixel(nodes[i])
-            for i in list(reversed(start)) + end
+            self.coor_to_pixel(self.nodes[p])
+            for p in self.stroke_order(c)
         ]
         
         cr.set_source_rgba(*color,0.5)
@@ -377,7 +513,7 @@ class EquivalencesGUI(Gtk.Window):
             x,y = self.coor_to_pixel(self.nodes[n])
             if n == node: cr.set_source_rgb(1.0,1.0,0.0)
             else: cr.set_source_rgb(0.8,0.8,0.8)
-            cr.arc(x, y, radius, 0, 2*np.pi)
+            cr.arc(x, y, radius, 0, 2*math.pi)
             cr.fill()
 
     def fill_background(self,cr):
@@ -385,13 +521,50 @@ class EquivalencesGUI(Gtk.Window):
         cr.set_source_rgb(1, 1, 1)
         cr.fill()
 
-    def on_draw(self, wid, cr):
-        self.update_win_size()
-        self.fill_background(cr)
+    # The graph and the preview are rendered into cached surfaces (layers),
+    # the highlights of the tool are drawn over them on every frame.
+
+    def view_key(self):
+        return (self.nodes_version, self.scale, self.shift, self.win_size)
+    def cached_layer(self, cr, name, key, size, render):
+        # a surface of the given size with render(layer_cr) drawn into it,
+        # rendered again only when the key changes
+        cached = self.layers.get(name)
+        if cached is not None and cached[0] == key: return cached[1]
+        w,h = size
+        surface = cr.get_target().create_similar(
+            cairo.CONTENT_COLOR_ALPHA, max(1, math.ceil(w)), max(1, math.ceil(h))
+        )
+        render(cairo.Context(surface))
+        self.layers[name] = (key, surface)
+        return surface
 
+    def render_graph_layer(self, cr):
+        self.fill_background(cr)
         self.display_equiv = self.equivalence
         self.draw_graph(cr)
+
+    def on_draw(self, wid, cr):
+        self.update_win_size()
+        surface = self.cached_layer(
+            cr, 'graph', (self.equivalence, self.view_key()),
+            self.win_size, self.render_graph_layer,
+        )
+        cr.set_source_surface(surface, 0, 0)
+        cr.paint()
+        self.display_equiv = self.equivalence
+        self.tool.display_fg(cr)
+
         self.draw_preview(cr)
+        if self.first_frame:
+            self.first_frame = False
+            _mark("first frame")
+            GLib.idle_add(self.after_first_frame)
+
+    def after_first_frame(self):
+        if self.profile_startup: print_startup_report()
+        self.update_closure_label()
+        return False # called once
 
     def draw_graph(self, cr):
         for i,c in enumerate(self.display_equiv.nontriv_classes):
@@ -402,8 +575,6 @@ class EquivalencesGUI(Gtk.Window):
         for i in range(len(self.nodes)):
             self.draw_node(cr, i)
 
-        self.tool.display_fg(cr)
-
     def draw_preview(self, cr):
         goal_border = False
         equiv = self.tool.previewed_equiv()
@@ -412,7 +583,6 @@ class EquivalencesGUI(Gtk.Window):
             equiv = self.cur_challenge
             goal_border = True
         if equiv is None: return
-        self.display_equiv = equiv
 
         xs, ys = zip(*(self.coor_to_pixel(coor) for coor in self.nodes))
         inner_border = 50
@@ -424,23 +594,39 @@ class EquivalencesGUI(Gtk.Window):
         ww,wh = self.win_size
         sw,sh = max_x-min_x, max_y-min_y
         scale = 0.3*min(wh/sh, ww/sw)
+        margin = 2 # for the goal border
+
+        def render(cr):
+            cr.translate(margin, margin)
+            cr.scale(scale, scale)
+
+            cr.rectangle(0,0,sw,sh)
+            cr.set_source_rgba(0.0, 0.0, 0.0, 0.05)
+            if goal_border:
+                cr.fill_preserve()
+                cr.set_source_rgb(0.0, 0.5, 0.0)
+                cr.set_line_width(3/scale)
+                cr.stroke()
+            else:
+                cr.fill()
+
+            cr.translate(-min_x, -min_y)
+            self.display_equiv = equiv
+            self.draw_graph(cr)
+
+        surface = self.cached_layer(
+            cr, 'preview', (equiv, goal_border, self.view_key()),
+            (sw*scale + 2*margin, sh*scale + 2*margin), render,
+        )
+        cr.set_source_surface(surface, outer_border - margin, outer_border - margin)
+        cr.paint()
 
         cr.save()
         cr.translate(outer_border, outer_border)
         cr.scale(scale, scale)
-
-        cr.rectangle(0,0,sw,sh)
-        cr.set_source_rgba(0.0, 0.0, 0.0, 0.05)
-        if goal_border:
-            cr.fill_preserve()
-            cr.set_source_rgb(0.0, 0.5, 0.0)
-            cr.set_line_width(3/scale)
-            cr.stroke()
-        else:
-            cr.fill()
-
         cr.translate(-min_x, -min_y)
-        self.draw_graph(cr)
+        self.display_equiv = equiv
+        self.tool.display_fg(cr)
         cr.restore()
 
     def save_undo(self):
@@ -455,26 +641,36 @@ class EquivalencesGUI(Gtk.Window):
                 break
         self.check_challenge()
 
-    def generate_challenges(self):
+    def choose_challenges(self):
         used = set(self.equiv_list.data_s)
         used.add(self.basic_tool.empty_equiv)
         used.add(self.basic_tool.full_equiv)
-        if self.last_verified is None and 2*(len(used)+self.max_challenges) < bell_number(self.num_nodes):
-            challenges = []
-            for _ in range(self.max_challenges):
-                equiv = FinEquiv.random(self.num_nodes)
-                if equiv in used: continue
-                used.add(equiv)
-                challenges.append(equiv)
-            return challenges
-        else:
-            if self.last_verified is None:
-                all_to_check = set(FinEquiv.collect_all(self.num_nodes))
-            else:
-                all_to_check = set(self.last_verified)
-            remaining = list(all_to_check - used)
-            random.shuffle(remaining)
-            return remaining[:self.max_challenges]
+        return generate_challenges(
+            self.num_nodes, used, self.max_challenges, self.last_verified,
+        )
+
+    # Verification of the generators (hints, minimal subsets) runs as
+    # a gui_jobs.Job, at most one at a time, its progress is shown
+    # in the solved progress bar.
+
+    def start_verify_job(self, fn, *args, on_done, keep_in_edit_mode = False, **kwargs):
+        from gui_jobs import Job
+        self.cancel_verify_job()
+        self.verify_job_kept = keep_in_edit_mode
+        def done(result):
+            self.verify_job = None
+            self.num_solved = self.num_solved # restores the progress bar
+            on_done(result)
+        self.verify_job = Job(
+            fn, *args, on_done = done,
+            on_progress = self.solved_progress_bar.set_fraction,
+            **kwargs
+        )
+    def cancel_verify_job(self):
+        if self.verify_job is None: return
+        self.verify_job.cancel()
+        self.verify_job = None
+        self.num_solved = self.num_solved
 
     def export_state(self):
         state = {
@@ -500,6 +696,7 @@ class EquivalencesGUI(Gtk.Window):
         self.scale = state['zoom']
         self.shift = tuple(state['shift'])
         self.nodes = [(x,y) for (x,y) in state['nodes']]
+        self.nodes_moved()
         self.num_nodes = len(self.nodes)
         n = self.num_nodes
         self.equivalence = FinEquiv(n, state['equivalence'])
@@ -555,17 +752,48 @@ class EquivalencesGUI(Gtk.Window):
         self.import_state(state)
         self.darea.queue_draw()
 
+def _process_start():
+    # the start of the process (before the interpreter started) on the clock
+    # of time.perf_counter, from /proc with the precision of a clock tick,
+    # None where it is not available
+    try:
+        with open("/proc/self/stat") as f: stat = f.read()
+        ticks = int(stat.rsplit(")", 1)[1].split()[19]) # starttime, field 22
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+    return time.perf_counter() - age
+
+def print_startup_report():
+    marks = list(_startup_marks)
+    process_start = _process_start()
+    if process_start is not None and process_start < marks[0][1]:
+        marks.insert(0, ("process start", process_start))
+    start_name, start = marks[0]
+    print("startup (ms)        total    step")
+    for (_, last), (name, t) in zip(marks, marks[1:]):
+        print(f"{name:18} {1000*(t-start):7.1f} {1000*(t-last):7.1f}")
+    first_frame = dict(marks)["first frame"] - start
+    if first_frame <= FIRST_FRAME_TARGET: verdict = "met"
+    else: verdict = "MISSED"
+    print(f"first frame {1000*first_frame:.1f} ms after the {start_name}, target {1000*FIRST_FRAME_TARGET:.0f} ms: {verdict}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('num_nodes', type=int, nargs='?', default=10)
     parser.add_argument("--reset", action = "store_true", help="don't load state at the start")
     parser.add_argument("--try", action = "store_true", help="don't save state at the end")
+    parser.add_argument("--profile-startup", action = "store_true", help="print the time spent before the first frame and compare it with the target")
 
     args = parser.parse_args()
     assert args.num_nodes > 0
+    # the tools combine the same few partitions over and over
+    FinEquiv.enable_cache()
     win = EquivalencesGUI(
         num_nodes = args.num_nodes,
         load_on_start = not args.reset,
         save_on_quit = not getattr(args, 'try'),
+        profile_startup = args.profile_startup,
     )
+    _mark("window ready")
     Gtk.main()
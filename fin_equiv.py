@@ -1,6 +1,8 @@
+import math
 import random
+import bisect
 import itertools
-from collections import defaultdict
+import functools
 
 def binom(n,k):
     if k < 0 or k > n: return 0
@@ -10,29 +12,52 @@ def binom(n,k):
         res = (res * (n-i)) // (i+1)
     return res
 def binom_index(n,subset):
-    k = len(subset)
-    if k == 0: return 0
-    elif subset[-1] < n-1:
-        return binom_index(n-1,subset)
-    else:
-        return binom_index(n-1,subset[:-1])+binom(n-1,k)
+    # colexicographic rank of a sorted subset of range(n)
+    pascal = _pascal_table(n)
+    return sum(pascal[x][i+1] for i,x in enumerate(subset))
 def subset_at_binom_index(n,k,index):
     assert n >= 0
     assert k >= 0
     assert k <= n
     assert 0 <= index < binom(n,k)
-    if k == 0:
-        assert index == 0
-        return []
+    pascal = _pascal_table(n)
+    res = []
     # use: binom(n,k) = binom(n-1,k-1) + binom(n-1,k)
-    x = binom(n-1,k)
-    if index < x:
-        res = subset_at_binom_index(n-1,k,index)
-    else:
-        res = subset_at_binom_index(n-1,k-1,index-x)
-        res.append(n-1)
+    for x in reversed(range(n)):
+        if k == 0: break
+        if pascal[x][k] <= index:
+            index -= pascal[x][k]
+            res.append(x)
+            k -= 1
+    res.reverse()
     return res
 
+# precomputed tables for ranking, grown on demand,
+# pascal[n][k] = binom(n,k), rows are padded with zeros,
+# bell_offsets[n][k] = number of partitions of n nodes in which
+#   fewer than k nodes lie outside the class of the last node
+_pascal = []
+_bell_offsets = []
+def _pascal_table(n):
+    if len(_pascal) <= n:
+        size = max(n+1, 2*len(_pascal))
+        _pascal[:] = [
+            [binom(m,k) for k in range(size+1)]
+            for m in range(size)
+        ]
+    return _pascal
+def _bell_offsets_table(n):
+    if len(_bell_offsets) <= n:
+        size = max(n+1, 2*len(_bell_offsets))
+        pascal = _pascal_table(size)
+        _bell_offsets[:] = [[0]]
+        for m in range(1,size):
+            row = [0]
+            for k in range(m):
+                row.append(row[-1] + pascal[m-1][k] * bell_number(k))
+            _bell_offsets.append(row)
+    return _bell_offsets
+
 bell_number_l = [1]
 def bell_number(n):
     assert n >= 0
@@ -42,24 +67,153 @@ def bell_number(n):
 def _calculate_bell_number(n):
     return sum(binom(n-1,k) * bell_number_l[k] for k in range(n))
 
+# Stirling numbers of the second kind, stirling2(n,k) partitions of n nodes
+# have exactly k classes, the rows are computed on demand
+stirling2_l = [[1]]
+def stirling2(n,k):
+    assert n >= 0
+    while len(stirling2_l) <= n:
+        prev = stirling2_l[-1]
+        m = len(stirling2_l)
+        stirling2_l.append([0] + [
+            k*(prev[k] if k < m else 0) + prev[k-1]
+            for k in range(1, m+1)
+        ])
+    if k < 0 or k > n: return 0
+    return stirling2_l[n][k]
+
+def _pack_rgs(rgs):
+    # canonical immutable storage of a restricted growth string
+    rgs = list(rgs)
+    if len(rgs) <= 256: return bytes(rgs)
+    else: return tuple(rgs)
+def _canonical_rgs(labels):
+    # relabel classes in the order of their first appearance
+    relabel = dict()
+    return _pack_rgs(relabel.setdefault(x, len(relabel)) for x in labels)
+
+def _find(parent, x):
+    # union-find root with path halving
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+def _union(parent, x, y):
+    x = _find(parent, x)
+    y = _find(parent, y)
+    if x < y: parent[y] = x
+    elif y < x: parent[x] = y
+
+def _join_rgs(rgs1, rgs2):
+    # union-find over the classes of rgs1,
+    # merged along the classes of rgs2
+    parent = list(range(len(rgs1)))
+    other_rep = [None]*len(rgs1)
+    for ci, cj in zip(rgs1, rgs2):
+        rep = other_rep[cj]
+        if rep is None: other_rep[cj] = ci
+        else: _union(parent, rep, ci)
+    return _canonical_rgs(_find(parent, ci) for ci in rgs1)
+def _meet_rgs(rgs1, rgs2):
+    return _canonical_rgs(zip(rgs1, rgs2))
+
+def _cached_commutative(op, maxsize):
+    # functools.lru_cache is thread-safe, the operands are ordered
+    # so that (a,b) and (b,a) share an entry
+    cached = functools.lru_cache(maxsize = maxsize)(op)
+    @functools.wraps(op)
+    def wrapper(rgs1, rgs2):
+        if rgs2 < rgs1: rgs1, rgs2 = rgs2, rgs1
+        return cached(rgs1, rgs2)
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+# the operations used by FinEquiv, replaced by FinEquiv.enable_cache
+_meet_op = _meet_rgs
+_join_op = _join_rgs
+
+# Stam's algorithm for uniform random partitions: choose a number of urns m
+# with probability m^n / (e * m! * bell_number(n)), throw the n nodes
+# into the urns uniformly, and take the non-empty urns as the classes
+_stam_cumulative = dict()
+def _stam_cumulative_probs(n):
+    if n not in _stam_cumulative:
+        log_weights = []
+        m = 1
+        while True:
+            log_weights.append(n*math.log(m) - math.lgamma(m+1))
+            # the weights decrease super-exponentially after the mode
+            if m > n and log_weights[-1] < max(log_weights) - 50: break
+            m += 1
+        max_log_weight = max(log_weights)
+        weights = [math.exp(w - max_log_weight) for w in log_weights]
+        total = sum(weights)
+        _stam_cumulative[n] = [x / total for x in itertools.accumulate(weights)]
+    return _stam_cumulative[n]
+def _stam_num_urns(n, uniform):
+    cumulative = _stam_cumulative_probs(n)
+    return min(bisect.bisect_right(cumulative, uniform), len(cumulative)-1) + 1
+
 class FinEquiv:
+    # a partition is stored as its restricted growth string (rgs):
+    # rgs[x] is the index of the class containing x, classes being
+    # numbered by their smallest element, other views are derived lazily
+    __slots__ = ('num_nodes', '_rgs', '_classes')
+
     def __init__(self, num_nodes, classes):
+        labels = [None]*num_nodes
+        for i,c in enumerate(classes):
+            for x in c:
+                assert labels[x] is None
+                labels[x] = i
+        assert None not in labels
         self.num_nodes = num_nodes
-        self.nodes = range(num_nodes)
-        self.classes = tuple(sorted(tuple(sorted(c)) for c in classes))
-        assert all(len(c) > 0 for c in self.classes)
+        self._rgs = _canonical_rgs(labels)
+        self._classes = None
 
-        self.node_to_class = [None]*num_nodes
-        for i,c in enumerate(self.classes):
-            for x in c:
-                assert self.node_to_class[x] is None
-                self.node_to_class[x] = i
-        assert None not in self.node_to_class
+    @staticmethod
+    def _from_rgs(rgs):
+        res = object.__new__(FinEquiv)
+        res.num_nodes = len(rgs)
+        res._rgs = rgs
+        res._classes = None
+        return res
+    @staticmethod
+    def from_labels(labels):
+        return FinEquiv._from_rgs(_canonical_rgs(labels))
+    def __reduce__(self):
+        return FinEquiv._from_rgs, (self._rgs,)
 
-        self.isolated_nodes = tuple(
+    @property
+    def rgs(self):
+        return self._rgs
+    @property
+    def nodes(self):
+        return range(self.num_nodes)
+    @property
+    def node_to_class(self):
+        return self._rgs
+    @property
+    def num_classes(self):
+        if self.num_nodes == 0: return 0
+        return max(self._rgs)+1
+    @property
+    def classes(self):
+        if self._classes is None:
+            classes = [[] for _ in range(self.num_classes)]
+            for x,ci in enumerate(self._rgs):
+                classes[ci].append(x)
+            self._classes = tuple(map(tuple, classes))
+        return self._classes
+    @property
+    def isolated_nodes(self):
+        return tuple(
             c[0] for c in self.classes if len(c) == 1
         )
-        self.nontriv_classes = tuple(
+    @property
+    def nontriv_classes(self):
+        return tuple(
             c for c in self.classes if len(c) > 1
         )
 
@@ -73,98 +227,177 @@ class FinEquiv:
         return ', '.join(items)
 
     def __eq__(self, other):
-        return isinstance(other, FinEquiv) and self.classes == other.classes
+        return isinstance(other, FinEquiv) and self._rgs == other._rgs
     def __hash__(self):
-        return hash(self.classes)
+        return hash(self._rgs)
 
     def relates(self, a,b):
-        return self.node_to_class[a] == self.node_to_class[b]
+        return self._rgs[a] == self._rgs[b]
+    def refines(self, other):
+        # self <= other in the lattice, every class of self lies in a class of other
+        assert self.num_nodes == other.num_nodes
+        image = [None]*self.num_classes
+        for ci, cj in zip(self._rgs, other._rgs):
+            if image[ci] is None: image[ci] = cj
+            elif image[ci] != cj: return False
+        return True
 
     def __or__(self, other):
         assert self.num_nodes == other.num_nodes
-        return self.generated_by(
-            self.num_nodes,
-            *itertools.chain(self.classes, other.classes)
-        )
+        return FinEquiv._from_rgs(_join_op(self._rgs, other._rgs))
     def __and__(self, other):
         assert self.num_nodes == other.num_nodes
-        classes = []
-        for c in self.classes:
-            refinement = defaultdict(list)
-            for x in c:
-                refinement[other.node_to_class[x]].append(x)
-            classes.extend(refinement.values())
-        return FinEquiv(self.num_nodes, classes)
+        return FinEquiv._from_rgs(_meet_op(self._rgs, other._rgs))
+
+    # optional memoization of meets and joins, see enable_cache
 
     @staticmethod
-    def generated_by(num_nodes, *classes):
-        graph = [
-            []
-            for x in range(num_nodes)
-        ]
-        for c in classes: # convert given classes to a graph
-            c = tuple(c)
-            if len(c) > 1:
-                x = c[0]
-                for y in c[1:]:
-                    graph[x].append(y)
-                    graph[y].append(x)
-
-        # convert graph to output classes
-        classes = []
-        used = [False]*num_nodes
-        for main in range(num_nodes):
-            if used[main]: continue
-            c = []
-            stack = [main]
-            while stack:
-                x = stack.pop()
-                if used[x]: continue
-                used[x] = True
-                c.append(x)
-                stack.extend(graph[x])
-            classes.append(c)
+    def enable_cache(maxsize = 65536):
+        # least recently used pairs are evicted when one of the caches
+        # exceeds maxsize entries, replaces a previously enabled cache
+        global _meet_op, _join_op
+        _meet_op = _cached_commutative(_meet_rgs, maxsize)
+        _join_op = _cached_commutative(_join_rgs, maxsize)
+    @staticmethod
+    def disable_cache():
+        global _meet_op, _join_op
+        _meet_op = _meet_rgs
+        _join_op = _join_rgs
+    @staticmethod
+    def cache_info():
+        # None if the cache is disabled
+        meet_op, join_op = _meet_op, _join_op
+        if meet_op is _meet_rgs: return None
+        return {
+            'meet' : meet_op.cache_info(),
+            'join' : join_op.cache_info(),
+        }
+    @staticmethod
+    def cache_clear():
+        if _meet_op is not _meet_rgs:
+            _meet_op.cache_clear()
+            _join_op.cache_clear()
 
-        return FinEquiv(num_nodes, classes)
+    @staticmethod
+    def generated_by(num_nodes, *classes):
+        # the classes can be arbitrary iterables of nodes, e.g. pairs
+        parent = list(range(num_nodes))
+        for c in classes:
+            c = iter(c)
+            x = next(c, None)
+            for y in c: _union(parent, x, y)
+        return FinEquiv._from_rgs(_canonical_rgs(
+            _find(parent, x) for x in range(num_nodes)
+        ))
 
     @staticmethod
     def empty(num_nodes):
-        return FinEquiv(num_nodes, [[x] for x in range(num_nodes)])
+        return FinEquiv._from_rgs(_pack_rgs(range(num_nodes)))
     @staticmethod
     def full(num_nodes):
-        return FinEquiv(num_nodes, [range(num_nodes)])
+        return FinEquiv._from_rgs(_pack_rgs([0]*num_nodes))
+    @staticmethod
+    def atom(num_nodes, a, b):
+        # the smallest partition relating a and b
+        return FinEquiv.generated_by(num_nodes, (a,b))
+
+    @staticmethod
+    def iter_rgs(num_nodes):
+        # all restricted growth strings in a Gray code order, consecutive
+        # strings differ at a single node, constant amortized time per step.
+        # The yielded read-only view is updated in place.
+        # Every node x > 0 runs through its values either upwards
+        #   0, m+1, m, ..., 1 or downwards 1, ..., m, m+1, 0
+        # where m is the maximum of the previous values,
+        # when it reaches the end, it switches the direction and waits
+        # for a change of a previous node (reflected Gray code)
+        assert 0 <= num_nodes <= 256
+        rgs = bytearray(num_nodes)
+        view = memoryview(rgs).toreadonly()
+        upwards = [True]*num_nodes
+        prefix_max = [0]*num_nodes
+        while True:
+            yield view
+            x = num_nodes-1
+            while x > 0 and rgs[x] == (1 if upwards[x] else 0):
+                x -= 1
+            if x <= 0: return
+            m = prefix_max[x]
+            if upwards[x]:
+                if rgs[x] == 0: rgs[x] = m+1
+                else: rgs[x] -= 1
+            else:
+                if rgs[x] == m+1: rgs[x] = 0
+                else: rgs[x] += 1
+            for y in range(x+1, num_nodes):
+                upwards[y] = not upwards[y]
+                prefix_max[y] = max(prefix_max[y-1], rgs[y-1])
+
+    @staticmethod
+    def iter_all(num_nodes):
+        for rgs in FinEquiv.iter_rgs(num_nodes):
+            yield FinEquiv._from_rgs(bytes(rgs))
+    @staticmethod
+    def iter_batches(num_nodes, batch_size = 65536):
+        # the same order as iter_rgs, in PartitionBatch chunks
+        import numpy as np
+        if num_nodes == 0: # only the empty partition, the rows can't be counted by bytes
+            yield PartitionBatch._from_rgs(np.zeros((1,0), dtype = np.uint8))
+            return
+        buf = bytearray()
+        def flush():
+            labels = np.frombuffer(bytes(buf), dtype = np.uint8)
+            buf.clear()
+            return PartitionBatch._from_rgs(labels.reshape(-1, num_nodes))
+        for rgs in FinEquiv.iter_rgs(num_nodes):
+            buf += rgs
+            if len(buf) >= batch_size * num_nodes: yield flush()
+        if buf: yield flush()
 
     @staticmethod
     def all_equiv_classes(num_nodes):
-        assert num_nodes >= 0
-        if num_nodes == 0:
-            yield ()
-        else:
-            x = (num_nodes-1,)
-            for rec_classes in FinEquiv.all_equiv_classes(num_nodes-1):
-                yield rec_classes+(x,)
-                for i,c in enumerate(rec_classes):
-                    yield rec_classes[:i] + (c+x,) + rec_classes[i+1:]
+        for equiv in FinEquiv.iter_all(num_nodes):
+            yield equiv.classes
 
     @staticmethod
     def collect_all(num_nodes):
-        return [
-            FinEquiv(num_nodes, classes)
-            for classes in FinEquiv.all_equiv_classes(num_nodes)
-        ]
+        return list(FinEquiv.iter_all(num_nodes))
 
     @staticmethod
-    def generate_lattice(generators):
-        stack = len(generators)
-        seen = set(stack)
-        while stack:
-            x = stack.pop()
+    def generate_lattice(generators, max_size = None, stats = None):
+        # semi-naive closure: every round combines only the elements
+        # found in the previous round with the elements seen so far,
+        # so every unordered pair is combined exactly once
+        seen = set()
+        new = []
+        for x in generators:
+            if x in seen: continue
+            seen.add(x)
+            new.append(x)
+        # stop early once the whole lattice is reached
+        limit = bell_number(new[0].num_nodes) if new else 0
+        if max_size is not None: limit = min(limit, max_size)
+        num_ops = 0
+        old = []
+        while new and len(seen) < limit:
             added = []
-            added.extend([x & y for y in seen])
-            added.extend([x | y for y in seen])
-            added = [y for y in added if x not in seen]
-            stack.extend(added)
-            seen.update(added)
+            pairs = (
+                (x,y)
+                for i,x in enumerate(new)
+                for y in itertools.chain(old, itertools.islice(new, i))
+            )
+            for x,y in pairs:
+                for z in (x & y, x | y):
+                    if z in seen: continue
+                    seen.add(z)
+                    added.append(z)
+                num_ops += 2
+                if len(seen) >= limit: break
+            old.extend(new)
+            new = added
+
+        if stats is not None: stats['operations'] = num_ops
+        return seen
 
     # indexing & uniform random generation
 
@@ -193,48 +426,505 @@ class FinEquiv:
         return FinEquiv(len(nodes), classes)
 
     def get_index(self):
-        n = self.num_nodes
-        if n == 0: return 0
-        
-        # find class with the last element
-        ci,c = next((i,c) for i,c in enumerate(self.classes) if self.num_nodes-1 in c)
-        c = c[:-1] # remove the 'n-1' element
-
-        # get base index
-        rest = self.drop_class(ci)
-        index = rest.get_index()
-        index = index * binom(n-1, len(c)) + binom_index(n-1, c)
-
-        # account for the previous summands
-        index += sum(binom(n-1,k) * bell_number(k) for k in range(n-1-len(c)))
+        # the index is composed from the size of the class containing
+        # the last node, the position of that class among the subsets,
+        # and the index of the partition of the remaining nodes
+        pascal = _pascal_table(self.num_nodes)
+        bell_offsets = _bell_offsets_table(self.num_nodes)
+        levels = []
+        remaining = list(self._rgs)
+        while remaining:
+            n = len(remaining)
+            last = remaining[-1]
+            c = [i for i in range(n-1) if remaining[i] == last]
+            levels.append((
+                bell_offsets[n][n-1-len(c)],
+                pascal[n-1][len(c)],
+                binom_index(n-1, c),
+            ))
+            remaining = [x for x in remaining if x != last]
 
+        index = 0
+        for offset, num_subsets, subset_index in reversed(levels):
+            index = offset + index * num_subsets + subset_index
         return index
 
     @staticmethod
     def at_index(n, index):
         assert 0 <= index < bell_number(n)
-        if n == 0: return FinEquiv(0, ())
-        for k in range(n):
-            x = binom(n-1,k) * bell_number(k)
-            if index < x: break
-            index -= x
+        pascal = _pascal_table(n)
+        bell_offsets = _bell_offsets_table(n)
+        labels = [None]*n
+        remaining = list(range(n))
+        while remaining:
+            n = len(remaining)
+            k = bisect.bisect_right(bell_offsets[n], index) - 1
+            index -= bell_offsets[n][k]
+            index, class_index = divmod(index, pascal[n-1][n-1-k])
+            c = subset_at_binom_index(n-1,n-1-k,class_index)+[n-1]
+            last = remaining[-1]
+            for i in c: labels[remaining[i]] = last
+            c = set(c)
+            remaining = [x for i,x in enumerate(remaining) if i not in c]
+        return FinEquiv.from_labels(labels)
+
+    # indices among the partitions with the same number of classes,
+    # the last node either forms a new class, or joins one of the classes
+    # of the remaining nodes: index = S(m-1,c-1) + class * S(m-1,c) + index of the rest
+
+    def get_index_with_classes(self):
+        index = 0
+        c = self.num_classes
+        for m in range(self.num_nodes, 0, -1):
+            label = self._rgs[m-1]
+            if label == c-1 and label not in self._rgs[:m-1]: c -= 1
+            else: index += stirling2(m-1, c-1) + label * stirling2(m-1, c)
+        return index
+    @staticmethod
+    def at_index_with_classes(n, num_classes, index):
+        assert 0 <= index < stirling2(n, num_classes)
+        choices = []
+        c = num_classes
+        for m in range(n, 0, -1):
+            new_class = stirling2(m-1, c-1)
+            if index < new_class:
+                choices.append(None)
+                c -= 1
+            else:
+                label, index = divmod(index - new_class, stirling2(m-1, c))
+                choices.append(label)
+        labels = []
+        c = 0
+        for label in reversed(choices):
+            if label is None:
+                label = c
+                c += 1
+            labels.append(label)
+        return FinEquiv._from_rgs(_pack_rgs(labels))
+
+    @staticmethod
+    def rank_many(equivs):
+        return PartitionBatch.from_equivs(equivs).get_indices()
+    @staticmethod
+    def unrank_many(num_nodes, indices):
+        return PartitionBatch.at_indices(num_nodes, indices).to_equivs()
+
+    @staticmethod
+    def random(num_nodes, rng = None):
+        # uniform sample, Stam's algorithm
+        if rng is None: rng = random
+        if num_nodes == 0: return FinEquiv.empty(0)
+        num_urns = _stam_num_urns(num_nodes, rng.random())
+        return FinEquiv.from_labels(
+            rng.randrange(num_urns) for _ in range(num_nodes)
+        )
+
+# batches of partitions as NumPy arrays
+
+def _rgs_dtype(num_nodes):
+    import numpy as np
+    if num_nodes <= 256: return np.uint8
+    else: return np.int32
+
+def _labels_from_reps(reps):
+    # reps[k,x] is the smallest node in the class of x
+    import numpy as np
+    k,n = reps.shape
+    class_starts = reps == np.arange(n)
+    class_indices = np.cumsum(class_starts, axis = 1) - 1
+    labels = np.take_along_axis(class_indices, reps, axis = 1)
+    return labels.astype(_rgs_dtype(n))
+
+def _canonical_rows(codes):
+    # relabel every row in the order of the first appearance,
+    # the codes are arbitrary integers
+    import numpy as np
+    k,n = codes.shape
+    if n == 0: return np.zeros((k,0), dtype = np.uint8)
+    if n <= 24:
+        # few columns: compare them directly
+        columns = np.ascontiguousarray(codes.T)
+        labels = np.empty((n,k), dtype = np.uint8)
+        num_classes = np.zeros(k, dtype = np.uint8)
+        for x in range(n):
+            label = num_classes.copy()
+            for y in range(x):
+                label = np.where(columns[y] == columns[x], labels[y], label)
+            labels[x] = label
+            num_classes += (label == num_classes)
+        return np.ascontiguousarray(labels.T)
+    if codes.min() >= 0 and codes.max() < n*n:
+        # small codes (as in the meets): the first node of every code
+        # is found in a table per row
+        return _first_appearance_rows(codes, n*n)
+    # arbitrary codes (the constructor), slower than FinEquiv one by one
+    order = np.argsort(codes, axis = 1, kind = 'stable')
+    sorted_codes = np.take_along_axis(codes, order, axis = 1)
+    starts = np.ones((k,n), dtype = bool)
+    starts[:,1:] = sorted_codes[:,1:] != sorted_codes[:,:-1]
+    group_starts = np.maximum.accumulate(
+        np.where(starts, np.arange(n), 0), axis = 1
+    )
+    # thanks to the stable sort, the group start is the smallest node
+    firsts = np.take_along_axis(order, group_starts, axis = 1)
+    reps = np.empty_like(firsts)
+    np.put_along_axis(reps, order, firsts, axis = 1)
+    return _labels_from_reps(reps)
+
+def _first_appearance_rows(codes, num_codes):
+    # _canonical_rows for codes in range(num_codes), the tables of the rows
+    # are filled from the last column, so the first node of a code stays
+    import numpy as np
+    k,n = codes.shape
+    labels = np.empty((k,n), dtype = _rgs_dtype(n))
+    chunk = max(1, 2**20 // num_codes)
+    for start in range(0, k, chunk):
+        flat = codes[start:start+chunk] + (np.arange(min(chunk, k-start)) * num_codes)[:,None]
+        firsts = np.empty(flat.shape[0] * num_codes, dtype = np.int64)
+        for x in reversed(range(n)): firsts[flat[:,x]] = x
+        labels[start:start+chunk] = _labels_from_reps(firsts[flat])
+    return labels
+
+_MAX_INT64 = 2**63-1
+def _numpy_rank_tables(n):
+    # the ranking tables as int64 arrays, (n+1) x (n+2),
+    # bell offsets are padded with _MAX_INT64
+    import numpy as np
+    pascal = _pascal_table(n+1)
+    bell_offsets = _bell_offsets_table(n)
+    pascal_np = np.array([row[:n+2] for row in pascal[:n+1]], dtype = np.int64)
+    bell_offsets_np = np.full((n+1, n+2), _MAX_INT64, dtype = np.int64)
+    for m in range(n+1):
+        bell_offsets_np[m,:m+1] = bell_offsets[m]
+    return pascal_np, bell_offsets_np
+
+# Vectorized ranking works with the classes as bitmasks (up to 25 nodes),
+# one row at a time it is the same as FinEquiv.get_index: the class of the last
+# free node, the other nodes of the class as a subset of the free nodes
+# (positions among them, pext / pdep), and the rest. Every class costs
+# a fixed number of operations on (K,) arrays, only the rows
+# with some classes left take part.
+
+_byte_tables = []
+def _get_byte_tables():
+    # pext[mask, x], pdep[mask, x] of single bytes, popcount[mask]
+    import numpy as np
+    if not _byte_tables:
+        masks = np.arange(256)[:,None]
+        xs = np.arange(256)[None,:]
+        pext = np.zeros((256,256), dtype = np.int64)
+        pdep = np.zeros((256,256), dtype = np.int64)
+        count = np.zeros((256,1), dtype = np.int64)
+        for bit in range(8):
+            in_mask = (masks >> bit) & 1
+            pext |= (((xs >> bit) & 1) * in_mask) << count
+            pdep |= (((xs >> count) & 1) * in_mask) << bit
+            count += in_mask
+        _byte_tables.extend((pext, pdep, count.ravel()))
+    return _byte_tables
+
+def _popcount(x, num_bytes):
+    _,_,popcount = _get_byte_tables()
+    res = popcount[x & 255]
+    for b in range(1, num_bytes):
+        res = res + popcount[(x >> 8*b) & 255]
+    return res
+def _pext(x, mask, num_bytes):
+    # the bits of x at the positions in mask, packed together
+    pext,_,popcount = _get_byte_tables()
+    res = pext[mask & 255, x & 255]
+    shift = popcount[mask & 255]
+    for b in range(1, num_bytes):
+        mask_b = (mask >> 8*b) & 255
+        res = res | (pext[mask_b, (x >> 8*b) & 255] << shift)
+        shift = shift + popcount[mask_b]
+    return res
+def _pdep(x, mask, num_bytes):
+    # the lowest bits of x spread to the positions in mask
+    _,pdep,popcount = _get_byte_tables()
+    res = pdep[mask & 255, x & 255]
+    shift = popcount[mask & 255]
+    for b in range(1, num_bytes):
+        mask_b = (mask >> 8*b) & 255
+        res = res | (pdep[mask_b, (x >> shift) & 255] << 8*b)
+        shift = shift + popcount[mask_b]
+    return res
+def _highest_bit(x):
+    import numpy as np
+    return np.frexp(x)[1] - 1 # exact for x < 2**53
+
+# Subsets of size k ranked in the colexicographic order as in binom_index,
+# that is the order of their bitmasks. Up to 20 positions, both directions
+# are single lookups into tables of all the bitmasks.
+
+_MAX_COLEX_TABLE = 20
+_colex_tables = dict()
+def _get_colex_table(m):
+    # (masks, starts, ranks): masks[starts[k] + index] is the subset,
+    # ranks[mask] its index
+    import numpy as np
+    if m not in _colex_tables:
+        masks = np.arange(1 << m, dtype = np.int64)
+        counts = _popcount(masks, 3)
+        order = np.argsort(counts, kind = 'stable')
+        starts = np.zeros(m+2, dtype = np.int64)
+        starts[1:] = np.cumsum(np.bincount(counts, minlength = m+1))
+        ranks = np.empty(1 << m, dtype = np.int64)
+        ranks[order] = np.arange(1 << m) - starts[counts[order]]
+        _colex_tables[m] = order, starts, ranks
+    return _colex_tables[m]
+
+def _colex_unrank(m, k, index, pascal):
+    if m <= _MAX_COLEX_TABLE:
+        masks, starts, _ = _get_colex_table(m)
+        return masks[starts[k] + index]
+    import numpy as np
+    mask = np.zeros(len(k), dtype = np.int64)
+    for p in reversed(range(m)):
+        num_subsets = pascal[p][k]
+        take = num_subsets <= index
+        index = index - np.where(take, num_subsets, 0)
+        k = k - take
+        mask |= take.astype(np.int64) << p
+    return mask
+def _colex_rank(m, mask, pascal):
+    if m <= _MAX_COLEX_TABLE:
+        _, _, ranks = _get_colex_table(m)
+        return ranks[mask]
+    import numpy as np
+    index = np.zeros(len(mask), dtype = np.int64)
+    count = np.zeros(len(mask), dtype = np.int64)
+    for p in range(m):
+        bit = (mask >> p) & 1
+        count += bit
+        index += np.where(bit, pascal[p][count], 0)
+    return index
+
+def _unrank_chunk(n, indices, pascal, bell_offsets):
+    import numpy as np
+    num_bytes = (n+7) // 8
+    k = len(indices)
+    rows = np.arange(k)
+    free = np.full(k, (1 << n)-1, dtype = np.int64)
+    sizes = np.full(k, n, dtype = np.int64)
+    levels = [] # (rows, class mask)
+    while len(rows):
+        num_others = (bell_offsets[sizes] <= indices[:,None]).sum(axis = 1) - 1
+        indices = indices - bell_offsets[sizes, num_others]
+        subset_size = sizes-1-num_others
+        indices, subset_indices = np.divmod(indices, pascal[sizes-1, subset_size])
+        last = np.left_shift(1, _highest_bit(free))
+        subset = _colex_unrank(n-1, subset_size, subset_indices, pascal)
+        c = _pdep(subset, free ^ last, num_bytes) | last
+        levels.append((rows, c))
+        free ^= c
+        active = num_others > 0
+        rows = rows[active]
+        indices = indices[active]
+        free = free[active]
+        sizes = num_others[active]
+    # the classes are numbered in the order of their smallest nodes
+    firsts = np.zeros(k, dtype = np.int64)
+    for rows, c in levels: firsts[rows] |= c & -c
+    labels = np.zeros((k,n), dtype = np.uint8)
+    for rows, c in levels:
+        label = _popcount(firsts[rows] & ((c & -c) - 1), num_bytes).astype(np.uint8)
+        nodes = np.unpackbits(
+            c.astype('<u4').view(np.uint8).reshape(-1,4), axis = 1, bitorder = 'little',
+        )[:,:n]
+        labels[rows] += nodes * label[:,None]
+    return labels
+
+def _rank_chunk(labels, pascal, bell_offsets):
+    import numpy as np
+    k,n = labels.shape
+    num_bytes = (n+7) // 8
+    # class masks, masks[i,c] for the class c of the row i
+    classes = labels.astype(np.int64) + (np.arange(k) * n)[:,None]
+    masks = np.bincount(
+        classes.ravel(), weights = np.broadcast_to(np.exp2(np.arange(n)), (k,n)).ravel(),
+        minlength = k*n,
+    ).astype(np.int64).reshape(k,n)
+    indices = np.zeros(k, dtype = np.int64)
+    # index = offset_1 + subset_index_1 + num_subsets_1 * (offset_2 + ...)
+    rows = np.arange(k)
+    free = np.full(k, (1 << n)-1, dtype = np.int64)
+    sizes = np.full(k, n, dtype = np.int64)
+    scales = np.ones(k, dtype = np.int64)
+    while len(rows):
+        last = _highest_bit(free)
+        c = masks[rows, labels[rows, last]]
+        class_size = _popcount(c, num_bytes)
+        last = np.left_shift(1, last)
+        subset = _pext(c ^ last, free ^ last, num_bytes)
+        subset_indices = _colex_rank(n-1, subset, pascal)
+        offsets = bell_offsets[sizes, sizes-class_size]
+        indices[rows] += scales * (offsets + subset_indices)
+        scales = scales * pascal[sizes-1, class_size-1]
+        free ^= c
+        sizes = sizes - class_size
+        active = sizes > 0
+        rows = rows[active]
+        free = free[active]
+        sizes = sizes[active]
+        scales = scales[active]
+    return indices
+
+_RANK_CHUNK = 16384 # rows processed at once, small enough to stay in the cache
 
-        x = binom(n-1, n-k-1)
-        rest_index = index // x
-        class_index = index % x
-        c = subset_at_binom_index(n-1,n-1-k,class_index)+[n-1]
-        rest = FinEquiv.at_index(k, rest_index)
-        return rest.insert_class(c)
+class PartitionBatch:
+    # K partitions of n nodes as a (K,n) array,
+    # every row is a restricted growth string as in FinEquiv
+    def __init__(self, labels):
+        import numpy as np
+        labels = np.asarray(labels)
+        assert labels.ndim == 2
+        self.labels = _canonical_rows(labels.astype(np.int64))
 
     @staticmethod
-    def random(num_nodes):
-        return FinEquiv.at_index(num_nodes, random.randrange(bell_number(num_nodes)))
+    def _from_rgs(labels):
+        res = object.__new__(PartitionBatch)
+        res.labels = labels
+        return res
+    @staticmethod
+    def from_equivs(equivs, num_nodes = None):
+        import numpy as np
+        equivs = list(equivs)
+        if num_nodes is None: num_nodes = equivs[0].num_nodes
+        assert all(equiv.num_nodes == num_nodes for equiv in equivs)
+        if num_nodes <= 256:
+            labels = np.frombuffer(
+                b''.join(equiv.rgs for equiv in equivs), dtype = np.uint8,
+            ).reshape(len(equivs), num_nodes)
+        else:
+            labels = np.array(
+                [equiv.rgs for equiv in equivs], dtype = np.int32,
+            ).reshape(len(equivs), num_nodes)
+        return PartitionBatch._from_rgs(labels)
+    def to_equivs(self):
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def num_nodes(self):
+        return self.labels.shape[1]
+    def __len__(self):
+        return self.labels.shape[0]
+    def __getitem__(self, i):
+        row = self.labels[i]
+        if self.num_nodes <= 256: return FinEquiv._from_rgs(row.tobytes())
+        else: return FinEquiv._from_rgs(tuple(row.tolist()))
+
+    def unique(self):
+        import numpy as np
+        if len(self) == 0: return self
+        return PartitionBatch._from_rgs(np.unique(self.labels, axis = 0))
+    @staticmethod
+    def concatenate(batches):
+        import numpy as np
+        return PartitionBatch._from_rgs(np.concatenate([
+            batch.labels for batch in batches
+        ]))
+
+    @staticmethod
+    def random(num_nodes, count, rng = None):
+        # uniform samples as in FinEquiv.random, rng is a NumPy Generator
+        import numpy as np
+        if rng is None: rng = np.random.default_rng()
+        if num_nodes == 0: return PartitionBatch._from_rgs(np.zeros((count,0), dtype = np.uint8))
+        cumulative = np.array(_stam_cumulative_probs(num_nodes))
+        num_urns = np.minimum(
+            np.searchsorted(cumulative, rng.random(count), side = 'right'),
+            len(cumulative)-1,
+        ) + 1
+        urns = (rng.random((count, num_nodes)) * num_urns[:,None]).astype(np.int64)
+        return PartitionBatch._from_rgs(_canonical_rows(urns))
+
+    # ranks as in FinEquiv.get_index, vectorized over the whole batch
+    # while the indices fit into int64 (up to 25 nodes)
+
+    @staticmethod
+    def at_indices(num_nodes, indices):
+        import numpy as np
+        n = num_nodes
+        if bell_number(n) > _MAX_INT64:
+            return PartitionBatch.from_equivs(
+                [FinEquiv.at_index(n, int(index)) for index in indices], n
+            )
+        indices = np.array(indices, dtype = np.int64).reshape(-1)
+        assert np.all((0 <= indices) & (indices < bell_number(n)))
+        if n == 0: return PartitionBatch._from_rgs(np.zeros((len(indices),0), dtype = np.uint8))
+        pascal, bell_offsets = _numpy_rank_tables(n)
+        labels = np.zeros((len(indices),n), dtype = np.uint8)
+        for start in range(0, len(indices), _RANK_CHUNK):
+            stop = start + _RANK_CHUNK
+            labels[start:stop] = _unrank_chunk(n, indices[start:stop], pascal, bell_offsets)
+        return PartitionBatch._from_rgs(labels)
+
+    def get_indices(self):
+        import numpy as np
+        n = self.num_nodes
+        if bell_number(n) > _MAX_INT64:
+            return np.array([equiv.get_index() for equiv in self.to_equivs()], dtype = object)
+        if n == 0: return np.zeros(len(self), dtype = np.int64)
+        pascal, bell_offsets = _numpy_rank_tables(n)
+        return np.concatenate([np.zeros(0, dtype = np.int64)] + [
+            _rank_chunk(self.labels[start:start+_RANK_CHUNK], pascal, bell_offsets)
+            for start in range(0, len(self), _RANK_CHUNK)
+        ])
+
+    # elementwise operations, a batch of length one is broadcasted
+
+    def _operands(self, other):
+        import numpy as np
+        assert self.num_nodes == other.num_nodes
+        a,b = np.broadcast_arrays(self.labels, other.labels)
+        return a.astype(np.int64), b.astype(np.int64)
+
+    def __and__(self, other):
+        a,b = self._operands(other)
+        # pair encoding followed by a relabelling
+        return PartitionBatch._from_rgs(_canonical_rows(a*self.num_nodes + b))
+
+    def __or__(self, other):
+        import numpy as np
+        a,b = self._operands(other)
+        k,n = a.shape
+        # label propagation: every node points to a smaller node
+        # of the same joined class, until it points to the smallest one
+        offsets = (np.arange(k) * n)[:,None]
+        flat_classes = [(a + offsets).ravel(), (b + offsets).ravel()]
+        reps = np.broadcast_to(np.arange(n), (k,n)).copy()
+        while True:
+            last_reps = reps
+            for classes in flat_classes:
+                class_mins = np.full(k*n, n, dtype = reps.dtype)
+                np.minimum.at(class_mins, classes, reps.ravel())
+                reps = class_mins[classes].reshape(k,n)
+            reps = np.take_along_axis(reps, reps, axis = 1) # pointer jumping
+            if np.array_equal(reps, last_reps): break
+        return PartitionBatch._from_rgs(_labels_from_reps(reps))
+
+    # all pairs, the result has K*M rows, the pair (i,j) at i*M+j
+
+    def _table_operands(self, other):
+        import numpy as np
+        a = PartitionBatch._from_rgs(np.repeat(self.labels, len(other), axis = 0))
+        b = PartitionBatch._from_rgs(np.tile(other.labels, (len(self), 1)))
+        return a,b
+    def meet_table(self, other):
+        a,b = self._table_operands(other)
+        return a & b
+    def join_table(self, other):
+        a,b = self._table_operands(other)
+        return a | b
 
 if __name__ == "__main__":
 
     for i in range(bell_number(5)):
         eq = FinEquiv.at_index(5,i)
         assert eq.get_index() == i
+    indices = list(FinEquiv.rank_many(FinEquiv.unrank_many(5, range(bell_number(5)))))
+    assert indices == list(range(bell_number(5)))
 
     eqs = FinEquiv.collect_all(5)
     # for eq in eqs: print(eq.get_index(), ':', eq)
@@ -246,6 +936,24 @@ if __name__ == "__main__":
     print('eq2:', eq2)
     print('eq1 & eq2:', eq1 & eq2)
     print('eq1 | eq2:', eq1 | eq2)
+    stats = dict()
+    lattice = FinEquiv.generate_lattice([eq1, eq2, FinEquiv.random(10)], stats = stats)
+    print('generated:', len(lattice), 'operations:', stats['operations'])
+    FinEquiv.enable_cache()
+    assert FinEquiv.generate_lattice([eq1, eq2, FinEquiv.random(10)]) is not None
+    assert eq1 & eq2 == eq2 & eq1 == FinEquiv._from_rgs(_meet_rgs(eq1.rgs, eq2.rgs))
+    assert eq1 | eq2 == eq2 | eq1 == FinEquiv._from_rgs(_join_rgs(eq1.rgs, eq2.rgs))
+    print(FinEquiv.cache_info())
+    FinEquiv.disable_cache()
+
+    batch = PartitionBatch.from_equivs([eq1, eq2])
+    assert batch.meet_table(batch).to_equivs() == [x & y for x in (eq1, eq2) for y in (eq1, eq2)]
+    assert batch.join_table(batch).to_equivs() == [x | y for x in (eq1, eq2) for y in (eq1, eq2)]
 
+    for n in range(7):
+        for k in range(n+1):
+            for i in range(stirling2(n,k)):
+                eq = FinEquiv.at_index_with_classes(n,k,i)
+                assert eq.num_classes == k and eq.get_index_with_classes() == i
     for n in range(10):
         print(n, bell_number(n))
@@ -0,0 +1,173 @@
+import time
+import random
+
+from fin_equiv import FinEquiv
+from atom_check import generates_all
+from symmetry import canonical_key
+
+# Search for the smallest sets of partitions generating the whole lattice Eq(n).
+#
+# Branch and bound: a randomized depth-first search finds some generating
+# set of size max_size, then exhaustive searches for smaller sizes follow.
+# Exhausting size k proves that no smaller set exists either, since
+# supersets of generating sets are generating.
+#
+# Pruning: the empty and the full partition are never needed (n >= 3),
+# and the last generator g added to a partial set S must satisfy
+#   meet(S) & g == empty, join(S) | g == full
+# which is checked before the (more expensive) atom-based completeness check.
+#
+# Symmetry: if the candidates are closed under relabelling of the nodes
+# (such as the default ones), partial sets are only extended once per
+# isomorphism class, recognized by their canonical form.
+
+class SearchTimeout(Exception):
+    pass
+
+class SearchRecord:
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        self.best = None
+        self.proven_optimal = False
+        self.exhausted_size = None # no generating set of this size exists
+        self.num_checked = 0 # number of completeness checks
+
+    def __str__(self):
+        if self.best is None: lines = ["no generating set found"]
+        else:
+            lines = [f"{len(self.best)} generators"
+                     + (" (optimal)" if self.proven_optimal else "")]
+            lines.extend('  '+str(g) for g in self.best)
+        return '\n'.join(lines)
+
+def default_candidates(num_nodes):
+    if num_nodes <= 2: return FinEquiv.collect_all(num_nodes)
+    return [
+        equiv for equiv in FinEquiv.iter_all(num_nodes)
+        if 1 < equiv.num_classes < num_nodes
+    ]
+
+class _SizeSearch:
+    def __init__(self, record, size, candidates, deadline):
+        self.record = record
+        self.size = size
+        self.candidates = candidates
+        self.deadline = deadline
+        num_nodes = record.num_nodes
+        self.empty = FinEquiv.empty(num_nodes)
+        self.full = FinEquiv.full(num_nodes)
+
+    def run(self):
+        return self.extend([], 0, self.full, self.empty)
+
+    def check_deadline(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+    def extend(self, chosen, start, meet, join):
+        self.check_deadline()
+        candidates = self.candidates
+        if len(chosen) == self.size-1:
+            return self.extend_last(chosen, candidates[start:], meet, join)
+        remaining = self.size - len(chosen)
+        for i in range(start, len(candidates)-remaining+1):
+            g = candidates[i]
+            res = self.extend(chosen + [g], i+1, meet & g, join | g)
+            if res is not None: return res
+        return None
+
+    def extend_last(self, chosen, candidates, meet, join):
+        for g in candidates:
+            if meet & g != self.empty or join | g != self.full: continue
+            self.check_deadline()
+            self.record.num_checked += 1
+            if generates_all(chosen + [g]): return chosen + [g]
+        return None
+
+class _SymmetricSizeSearch(_SizeSearch):
+    def run(self):
+        self.seen = set()
+        return self.extend([], 0, self.full, self.empty)
+
+    def extend(self, chosen, start, meet, join):
+        if len(chosen) == self.size-1:
+            candidates = [g for g in self.candidates if g not in chosen]
+            return self.extend_last(chosen, candidates, meet, join)
+        self.check_deadline()
+        for g in self.candidates:
+            if g in chosen: continue
+            extended = chosen + [g]
+            key = canonical_key(extended)
+            if key in self.seen: continue
+            self.seen.add(key)
+            res = self.extend(extended, 0, meet & g, join | g)
+            if res is not None: return res
+        return None
+
+def find_generating_set(num_nodes, size, candidates = None, record = None, deadline = None,
+                        symmetric = None):
+    # exhaustive depth-first search over the sets of exactly 'size' candidates,
+    # symmetric requires the candidates to be closed under node relabelling
+    if symmetric is None: symmetric = candidates is None
+    if candidates is None: candidates = default_candidates(num_nodes)
+    if record is None: record = SearchRecord(num_nodes)
+    if size > len(candidates): return None
+    search_cl = _SymmetricSizeSearch if symmetric else _SizeSearch
+    res = search_cl(record, size, candidates, deadline).run()
+    if res is not None:
+        if record.best is None or len(res) < len(record.best):
+            record.best = tuple(res)
+    return res
+
+def minimum_generating_set(num_nodes, max_size = 4, candidates = None,
+                           time_limit = None, rng = None, verbose = False,
+                           symmetric = None):
+    if symmetric is None: symmetric = candidates is None
+    if candidates is None: candidates = default_candidates(num_nodes)
+    if rng is None: rng = random
+    candidates = list(candidates)
+    rng.shuffle(candidates)
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    record = SearchRecord(num_nodes)
+
+    # upper bound
+    try:
+        for size in range(min(max_size, len(candidates)), len(candidates)+1):
+            if find_generating_set(num_nodes, size, candidates, record, deadline, symmetric) is not None:
+                break
+        else: return record
+        if verbose: print(f"found {len(record.best)} generators")
+
+        # lower sizes
+        while len(record.best) > 1:
+            size = len(record.best)-1
+            if find_generating_set(num_nodes, size, candidates, record, deadline, symmetric) is None:
+                record.exhausted_size = size
+                record.proven_optimal = True
+                break
+            if verbose: print(f"found {len(record.best)} generators")
+        else: record.proven_optimal = True
+    except SearchTimeout:
+        pass
+    return record
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_nodes', type=int, nargs='?', default=6)
+    parser.add_argument('--max-size', type=int, default=4)
+    parser.add_argument('--time-limit', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--no-symmetry', action='store_true')
+    args = parser.parse_args()
+
+    start = time.time()
+    record = minimum_generating_set(
+        args.num_nodes, max_size = args.max_size, time_limit = args.time_limit,
+        rng = random.Random(args.seed), verbose = True,
+        symmetric = not args.no_symmetry,
+    )
+    print(record)
+    print("completeness checks:", record.num_checked)
+    print("time:", time.time() - start)
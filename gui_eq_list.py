@@ -1,11 +1,17 @@
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk, GLib
-import numpy as np
 import os
 
 from fin_equiv import FinEquiv
 
+# The closure of the generators is kept up to date while the generators
+# are edited only for small n, Bell(6) = 203, so that every change takes
+# at most a fraction of a second on the main thread.
+# For larger n, the GUI counts the closure in a worker
+# (and the closure module is not imported at the start).
+LIVE_CLOSURE_MAX_NODES = 6
+
 class RenameableLabel(Gtk.EventBox):
     def __init__(self, name):
         super().__init__()
@@ -132,6 +138,10 @@ class EquivListRow(Gtk.ListBoxRow):
         listbox = self.get_parent()
         listbox.data_s.remove(self.equiv)
         listbox.remove(self)
+        if self.is_generator:
+            if listbox.closure is not None:
+                listbox.closure.remove_generator(self.equiv)
+            listbox.gui.update_closure_label()
     def join_with_current(self, *args):
         listbox = self.get_parent()
         gui = listbox.gui
@@ -167,6 +177,7 @@ class EquivList(Gtk.ListBox):
         self.last_i = 0
         self.preview = None
         self.gui = gui
+        self.closure = self.new_closure()
         self.set_selection_mode(Gtk.SelectionMode.NONE)
         new_button = Gtk.Button.new_from_icon_name("list-add", Gtk.IconSize.SMALL_TOOLBAR)
         new_button.set_tooltip_text("Add current (F2)")
@@ -213,6 +224,15 @@ class EquivList(Gtk.ListBox):
 
             self.data_s.add(equiv)
             self._add_row(EquivListRow(name, equiv, self._edit_mode, self._edit_mode))
+            if self._edit_mode:
+                if self.closure is not None: self.closure.add_generator(equiv)
+                self.gui.update_closure_label()
+
+    def new_closure(self, generators = ()):
+        # None if n is too large for the live closure
+        if self.gui.num_nodes > LIVE_CLOSURE_MAX_NODES: return None
+        from closure import Closure
+        return Closure(self.gui.num_nodes, generators)
 
     def get_rows(self):
         return [row for row in self.get_children() if isinstance(row, EquivListRow)]
@@ -239,3 +259,5 @@ class EquivList(Gtk.ListBox):
         for row in state['rows']:
             self._add_row(EquivListRow.from_state(row, self.gui.num_nodes, self._edit_mode))
         self.data_s = set(self.get_data())
+        self.closure = self.new_closure(self.get_generators())
+        self.gui.update_closure_label()
@@ -0,0 +1,88 @@
+import threading
+import multiprocessing
+import traceback
+
+from gi.repository import GLib
+
+# Heavy computations of the GUI run in worker processes, so that the window
+# keeps responding. A reader thread receives the messages of the worker
+# and passes them to the GTK main loop by GLib.idle_add,
+# the callbacks are therefore called from the main thread.
+#
+# The workers are not forked from the GUI process, which has GTK threads
+# running, but started by a fork server (or spawned where there is none).
+# Like every multiprocessing child, they import the main script (without
+# running its __main__ block), so equiv_game.py and Gtk get imported anyway.
+# The fork server does that once and the workers inherit it, spawned workers
+# repeat it every time.
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _context = multiprocessing.get_context('forkserver')
+else:
+    _context = multiprocessing.get_context('spawn')
+
+def _run_job(conn, fn, args, kwargs):
+    last = [None]
+    def report(fraction):
+        # only noticeable changes are sent
+        if last[0] is not None and fraction - last[0] < 0.01: return
+        last[0] = fraction
+        conn.send(('progress', fraction))
+    try:
+        result = fn(*args, report = report, **kwargs)
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    else:
+        conn.send(('done', result))
+    conn.close()
+
+class Job:
+    # calls fn(*args, report = ..., **kwargs) in a worker process,
+    # fn, the arguments and the result have to be picklable
+    def __init__(self, fn, *args, on_done = None, on_progress = None, on_error = None, **kwargs):
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.cancelled = False
+        self.finished = False
+
+        self._conn, child_conn = _context.Pipe(duplex = False)
+        self.process = _context.Process(
+            target = _run_job, args = (child_conn, fn, args, kwargs), daemon = True,
+        )
+        self.process.start()
+        child_conn.close()
+        self._thread = threading.Thread(target = self._read, daemon = True)
+        self._thread.start()
+
+    def _read(self):
+        while True:
+            try:
+                kind, value = self._conn.recv()
+            except (EOFError, OSError):
+                kind, value = 'error', "The worker process ended unexpectedly"
+            GLib.idle_add(self._dispatch, kind, value)
+            if kind != 'progress': break
+        self._conn.close()
+        self.process.join()
+
+    def _dispatch(self, kind, value):
+        if self.cancelled: return False
+        if kind == 'progress':
+            if self.on_progress is not None: self.on_progress(value)
+        else:
+            self.finished = True
+            if kind == 'done' and self.on_done is not None: self.on_done(value)
+            elif kind == 'error':
+                if self.on_error is not None: self.on_error(value)
+                else: print(value)
+        return False # remove from the idle callbacks
+
+    @property
+    def running(self):
+        return not (self.finished or self.cancelled)
+    def cancel(self):
+        # no callback is called after cancelling
+        if not self.running: return
+        self.cancelled = True
+        self.process.terminate()
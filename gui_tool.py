@@ -92,6 +92,7 @@ class MoveNode(NodeTool):
     def on_motion(self, pixel):
         coor = self.gui.pixel_to_coor(pixel)
         self.gui.nodes[self.node] = coor
+        self.gui.nodes_moved()
         self.redraw()
 
 class JoinNodes(NodeTool):
@@ -218,12 +219,12 @@ class LatticeStep(Tool):
 
 class JoinEquiv(LatticeStep):
     def candidate_score(self, equiv):
-        return len(equiv.classes)
+        return equiv.num_classes
     def use_equiv(self, equiv):
         return self.gui.equivalence | equiv
 
 class MeetEquiv(LatticeStep):
     def candidate_score(self, equiv):
-        return -len(equiv.classes)
+        return -equiv.num_classes
     def use_equiv(self, equiv):
         return self.gui.equivalence & equiv
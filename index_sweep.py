@@ -0,0 +1,92 @@
+import os
+import copy
+import operator
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+from fin_equiv import FinEquiv, bell_number
+
+# The partitions of n nodes are in bijection with range(bell_number(n))
+# through FinEquiv.at_index, so a sweep over all of them can be split
+# into index ranges (shards) evaluated by separate processes.
+# The evaluated functions have to be picklable (defined at module level).
+
+def _sweep_shard(num_nodes, start, stop, fn, reduce_fn, initial, chunk_size):
+    acc = copy.deepcopy(initial) # reduce_fn may update it in place
+    for chunk_start in range(start, stop, chunk_size):
+        chunk = range(chunk_start, min(stop, chunk_start + chunk_size))
+        for equiv in FinEquiv.unrank_many(num_nodes, chunk):
+            acc = reduce_fn(acc, fn(equiv))
+    return acc
+
+def sweep(num_nodes, fn, reduce_fn = operator.add, initial = 0, merge_fn = None,
+          start = 0, stop = None, num_workers = None, num_shards = None,
+          chunk_size = 4096):
+    # reduce_fn(acc, fn(equiv)) over all partitions with index in [start, stop),
+    # every shard starts from its own copy of initial, the shard results
+    # are merged in the index order by merge_fn (by default the same as reduce_fn)
+    if stop is None: stop = bell_number(num_nodes)
+    if merge_fn is None: merge_fn = reduce_fn
+    if num_workers is None: num_workers = os.cpu_count() or 1
+    if num_shards is None: num_shards = 4*num_workers
+    shard_size = max(chunk_size, -(-(stop - start) // num_shards))
+    shards = [
+        (shard_start, min(stop, shard_start + shard_size))
+        for shard_start in range(start, stop, shard_size)
+    ]
+    args = (fn, reduce_fn, initial, chunk_size)
+    if num_workers == 1 or len(shards) <= 1:
+        results = [_sweep_shard(num_nodes, a, b, *args) for a,b in shards]
+    else:
+        with ProcessPoolExecutor(num_workers) as executor:
+            futures = [
+                executor.submit(_sweep_shard, num_nodes, a, b, *args)
+                for a,b in shards
+            ]
+            results = [future.result() for future in futures]
+    if not results: return copy.deepcopy(initial)
+    return functools.reduce(merge_fn, results)
+
+def _indicator(predicate, equiv):
+    return int(bool(predicate(equiv)))
+def count(num_nodes, predicate, **kwargs):
+    return sweep(num_nodes, functools.partial(_indicator, predicate), **kwargs)
+
+def _num_classes_hist(num_nodes, equiv):
+    hist = [0]*(num_nodes+1)
+    hist[equiv.num_classes] = 1
+    return hist
+def _add_hists(hist1, hist2):
+    return [a+b for a,b in zip(hist1, hist2)]
+def num_classes_histogram(num_nodes, **kwargs):
+    # hist[k] = number of partitions with k classes (Stirling numbers)
+    return sweep(
+        num_nodes, functools.partial(_num_classes_hist, num_nodes),
+        reduce_fn = _add_hists, initial = [0]*(num_nodes+1), **kwargs
+    )
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_nodes', type=int, nargs='?', default=9)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.time()
+    hist = num_classes_histogram(args.num_nodes, num_workers = args.workers)
+    print(hist)
+    print("total:", sum(hist), "bell:", bell_number(args.num_nodes))
+    print("time:", time.time() - start)
+
+    # an accumulator updated in place
+    from collections import Counter
+    def add_num_classes(counter, equiv):
+        counter[equiv.num_classes] += 1
+        return counter
+    counter = sweep(
+        6, lambda equiv: equiv, reduce_fn = add_num_classes, merge_fn = operator.add,
+        initial = Counter(), num_workers = 1, num_shards = 3, chunk_size = 16,
+    )
+    assert [counter[k] for k in range(7)] == num_classes_histogram(6, num_workers = 1)
@@ -0,0 +1,55 @@
+import math
+
+class NodeGrid:
+    # uniform grid over the node coordinates for nearest node queries,
+    # a query within a radius comparable to the cell size
+    # looks only at a few cells around the point
+    def __init__(self, points, cell_size):
+        self.cell_size = cell_size
+        self.points = list(points)
+        self.cells = dict()
+        for i,p in enumerate(self.points):
+            self.cells.setdefault(self._cell(p), []).append(i)
+
+    def _cell(self, p):
+        x,y = p
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def nearest(self, p, radius):
+        # the index of the nearest point closer than radius, or None,
+        # ties are broken by the smaller index
+        x,y = p
+        x0, y0 = self._cell((x-radius, y-radius))
+        x1, y1 = self._cell((x+radius, y+radius))
+        if (x1-x0+1) * (y1-y0+1) > len(self.cells):
+            candidates = (i for cell in self.cells.values() for i in cell)
+        else:
+            candidates = (
+                i
+                for cx in range(x0, x1+1)
+                for cy in range(y0, y1+1)
+                for i in self.cells.get((cx,cy), ())
+            )
+        best = None
+        for i in candidates:
+            px,py = self.points[i]
+            candidate = ((px-x)**2 + (py-y)**2, i)
+            if best is None or candidate < best: best = candidate
+        if best is None or best[0] >= radius**2: return None
+        return best[1]
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    points = [(random.random(), random.random()) for _ in range(500)]
+    radius = 0.02
+    grid = NodeGrid(points, radius)
+    for _ in range(1000):
+        p = (random.random(), random.random())
+        sq_dist, i = min(((x-p[0])**2 + (y-p[1])**2, i) for i,(x,y) in enumerate(points))
+        expected = i if sq_dist < radius**2 else None
+        assert grid.nearest(p, radius) == expected
+    start = time.time()
+    for _ in range(1000): grid.nearest((random.random(), random.random()), radius)
+    print("query:", (time.time() - start) / 1000)
@@ -0,0 +1,110 @@
+from fin_equiv import FinEquiv, PartitionBatch, bell_number
+
+# A set of partitions of n nodes stored as one bit per rank (FinEquiv.get_index),
+# Bell(13) bits take 3.5 MB. The bits can live in a memory-mapped file.
+
+class RankBitmap:
+    def __init__(self, size, fname = None):
+        import numpy as np
+        self.size = size
+        num_bytes = (size + 7) // 8
+        if fname is None: self.bits = np.zeros(num_bytes, dtype = np.uint8)
+        else: self.bits = np.memmap(fname, dtype = np.uint8, mode = 'w+', shape = (num_bytes,))
+        self.count = 0
+
+    @staticmethod
+    def for_nodes(num_nodes, fname = None):
+        return RankBitmap(bell_number(num_nodes), fname)
+    @staticmethod
+    def open(fname, size):
+        # an existing memory-mapped bitmap
+        import numpy as np
+        res = object.__new__(RankBitmap)
+        res.size = size
+        res.bits = np.memmap(fname, dtype = np.uint8, mode = 'r+', shape = ((size + 7) // 8,))
+        res.count = int(np.unpackbits(res.bits).sum())
+        return res
+    def copy(self):
+        res = object.__new__(RankBitmap)
+        res.size = self.size
+        res.bits = self.bits.copy()
+        res.count = self.count
+        return res
+    def flush(self):
+        if hasattr(self.bits, 'flush'): self.bits.flush()
+
+    def __len__(self):
+        return self.count
+    def __contains__(self, rank):
+        return bool(self.bits[rank >> 3] & (1 << (rank & 7)))
+
+    def contains_many(self, ranks):
+        import numpy as np
+        ranks = np.asarray(ranks, dtype = np.int64)
+        return (self.bits[ranks >> 3] & (1 << (ranks & 7)).astype(np.uint8)) != 0
+    def add_many(self, ranks):
+        # bulk test-and-set, returns the sorted ranks which were not present before
+        import numpy as np
+        ranks = np.unique(np.asarray(ranks, dtype = np.int64))
+        assert not len(ranks) or (0 <= ranks[0] and ranks[-1] < self.size)
+        ranks = ranks[~self.contains_many(ranks)]
+        np.bitwise_or.at(self.bits, ranks >> 3, (1 << (ranks & 7)).astype(np.uint8))
+        self.count += len(ranks)
+        return ranks
+    def add(self, rank):
+        return len(self.add_many([rank])) > 0
+
+    def iter_ranks(self, chunk_size = 1 << 16, exclude = None):
+        # arrays of the present ranks in increasing order,
+        # without the ranks present in the bitmap 'exclude'
+        import numpy as np
+        for start in range(0, len(self.bits), chunk_size):
+            chunk = self.bits[start : start + chunk_size]
+            if exclude is not None: chunk = chunk & ~exclude.bits[start : start + chunk_size]
+            ranks = np.flatnonzero(np.unpackbits(chunk, bitorder = 'little'))
+            if len(ranks): yield ranks + 8*start
+
+def generate_lattice(generators, fname = None, chunk_size = 256):
+    # semi-naive closure as FinEquiv.generate_lattice over ranks: in every round,
+    # the new elements are combined with all the elements seen before the round
+    generators = list(generators)
+    num_nodes = generators[0].num_nodes
+    seen = RankBitmap.for_nodes(num_nodes, fname)
+    seen.add_many(FinEquiv.rank_many(generators))
+    before = RankBitmap(seen.size)
+    while len(seen) < seen.size:
+        snapshot = seen.copy()
+        for new in snapshot.iter_ranks(chunk_size // 8, exclude = before):
+            new = PartitionBatch.at_indices(num_nodes, new)
+            for others in snapshot.iter_ranks(chunk_size // 8):
+                others = PartitionBatch.at_indices(num_nodes, others)
+                seen.add_many(new.meet_table(others).get_indices())
+                seen.add_many(new.join_table(others).get_indices())
+                if len(seen) == seen.size: break
+            if len(seen) == seen.size: break
+        if len(seen) == snapshot.count: break
+        before = snapshot
+    seen.flush()
+    return seen
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('num_nodes', type=int, nargs='?', default=9)
+    parser.add_argument('--num-generators', type=int, default=4)
+    args = parser.parse_args()
+
+    gens = [FinEquiv.random(6) for _ in range(3)]
+    bitmap = generate_lattice(gens)
+    expected = FinEquiv.generate_lattice(gens)
+    assert sorted(eq.get_index() for eq in expected) == [
+        int(rank) for ranks in bitmap.iter_ranks() for rank in ranks
+    ]
+
+    gens = [FinEquiv.random(args.num_nodes) for _ in range(args.num_generators)]
+    start = time.time()
+    bitmap = generate_lattice(gens)
+    print("generated:", len(bitmap), "of", bitmap.size)
+    print("time:", time.time() - start)
@@ -0,0 +1,156 @@
+import math
+from collections import Counter
+
+from fin_equiv import FinEquiv
+
+# The lattice of partitions is invariant under relabelling of the nodes,
+# so sets of partitions that differ only by a permutation of the nodes
+# generate isomorphic sublattices.
+
+def permute(equiv, perm):
+    # the node x is renamed to perm[x]
+    labels = [None]*equiv.num_nodes
+    for x,ci in enumerate(equiv.node_to_class):
+        labels[perm[x]] = ci
+    return FinEquiv.from_labels(labels)
+def inverse_permutation(perm):
+    res = [None]*len(perm)
+    for x,y in enumerate(perm): res[y] = x
+    return res
+
+# orbits of single partitions, determined by the sizes of the classes
+
+def equiv_type(equiv):
+    return tuple(sorted((len(c) for c in equiv.classes), reverse = True))
+def type_representative(class_sizes):
+    labels = [
+        ci
+        for ci,size in enumerate(class_sizes)
+        for _ in range(size)
+    ]
+    return FinEquiv.from_labels(labels)
+def orbit_representative(equiv):
+    return type_representative(equiv_type(equiv))
+
+def _integer_partitions(n, max_part):
+    if n == 0:
+        yield ()
+        return
+    for part in range(min(n, max_part), 0, -1):
+        for rest in _integer_partitions(n-part, part):
+            yield (part,)+rest
+def orbit_representatives(num_nodes):
+    return [
+        type_representative(class_sizes)
+        for class_sizes in _integer_partitions(num_nodes, num_nodes)
+    ]
+def orbit_size(equiv):
+    class_sizes = equiv_type(equiv)
+    res = math.factorial(equiv.num_nodes)
+    for size in class_sizes: res //= math.factorial(size)
+    for multiplicity in Counter(class_sizes).values(): res //= math.factorial(multiplicity)
+    return res
+
+# canonical forms of sets of partitions under simultaneous relabelling,
+# by individualization and refinement of node colourings
+
+def _refine(equivs, colors):
+    # split the colour classes until every node "sees" the same multiset
+    # of coloured classes as the other nodes of its colour,
+    # the order of the original colours is kept
+    num_colors = len(set(colors))
+    while True:
+        node_sigs = [[] for _ in colors]
+        for equiv in equivs:
+            for c in equiv.classes:
+                class_sig = tuple(sorted(colors[x] for x in c))
+                for x in c: node_sigs[x].append(class_sig)
+        sigs = [
+            (color, tuple(sorted(node_sig)))
+            for color, node_sig in zip(colors, node_sigs)
+        ]
+        ranks = {sig : i for i,sig in enumerate(sorted(set(sigs)))}
+        colors = [ranks[sig] for sig in sigs]
+        if len(ranks) == num_colors: return colors
+        num_colors = len(ranks)
+
+def _twin_keys(equivs):
+    # swapping two nodes with the same key fixes every partition:
+    # the nodes are in the same class, or both are isolated
+    isolated = [set(equiv.isolated_nodes) for equiv in equivs]
+    return [
+        tuple(
+            -1 if x in iso else equiv.node_to_class[x]
+            for equiv, iso in zip(equivs, isolated)
+        )
+        for x in range(equivs[0].num_nodes)
+    ]
+
+def canonical_form(equivs):
+    # returns (key, perm) such that relabelling the partitions by perm
+    # gives a set with the rgs tuple 'key', same for all the relabellings
+    equivs = list(equivs)
+    assert equivs
+    n = equivs[0].num_nodes
+    twin_keys = _twin_keys(equivs)
+    best = [None, None]
+
+    def search(colors):
+        cells = dict()
+        for x,color in enumerate(colors):
+            cells.setdefault(color, []).append(x)
+        branching = [(len(cell), color) for color, cell in cells.items() if len(cell) > 1]
+        if not branching: # discrete colouring = permutation
+            key = tuple(sorted(permute(equiv, colors).rgs for equiv in equivs))
+            if best[0] is None or key < best[0]:
+                best[0] = key
+                best[1] = colors
+            return
+        _, color = min(branching)
+        used_twins = set()
+        for v in cells[color]:
+            if twin_keys[v] in used_twins: continue
+            used_twins.add(twin_keys[v])
+            individualized = [
+                (c, 0 if x == v else 1)
+                for x,c in enumerate(colors)
+            ]
+            ranks = {c : i for i,c in enumerate(sorted(set(individualized)))}
+            search(_refine(equivs, [ranks[c] for c in individualized]))
+
+    search(_refine(equivs, [0]*n))
+    return best[0], best[1]
+
+def canonical_key(equivs):
+    return canonical_form(equivs)[0]
+def canonical_set(equivs):
+    key, _ = canonical_form(equivs)
+    return [FinEquiv._from_rgs(rgs) for rgs in key]
+
+# closure up to symmetry: isomorphic generator sets share a single closure
+
+def generate_lattice(generators, cache = None, **kwargs):
+    # as FinEquiv.generate_lattice, the closures of canonical generator
+    # sets are stored in the cache (a dict) and relabelled back
+    key, perm = canonical_form(generators)
+    if cache is not None and key in cache: lattice = cache[key]
+    else:
+        lattice = FinEquiv.generate_lattice(
+            [FinEquiv._from_rgs(rgs) for rgs in key], **kwargs
+        )
+        if cache is not None: cache[key] = lattice
+    inverse = inverse_permutation(perm)
+    return set(permute(equiv, inverse) for equiv in lattice)
+
+if __name__ == "__main__":
+    import random
+
+    n = 7
+    for _ in range(100):
+        equivs = [FinEquiv.random(n) for _ in range(3)]
+        perm = list(range(n))
+        random.shuffle(perm)
+        permuted = [permute(equiv, perm) for equiv in reversed(equivs)]
+        assert canonical_key(equivs) == canonical_key(permuted)
+    assert sum(orbit_size(equiv) for equiv in orbit_representatives(n)) == len(FinEquiv.collect_all(n))
+    print(len(orbit_representatives(n)), "orbits of single partitions")